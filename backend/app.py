@@ -1,3 +1,4 @@
+import os
 from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
@@ -20,8 +21,8 @@ def create_app():
         r"/api/*": {
             "origins": ["http://localhost:5173", "http://127.0.0.1:5173"],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"],
-            "expose_headers": ["Content-Disposition"],
+            "allow_headers": ["Content-Type", "Authorization", "If-None-Match", "Idempotency-Key"],
+            "expose_headers": ["Content-Disposition", "ETag", "Idempotent-Replayed"],
             "supports_credentials": True
         }
     })
@@ -73,6 +74,37 @@ def create_app():
     
     return app
 
+
+_background_jobs_started = False
+
+
+def start_background_jobs(app):
+    """
+    启动后台定时任务，每个进程只启动一次
+
+    调试模式下 Werkzeug 重载器的监控进程不提供服务，只在其子进程（WERKZEUG_RUN_MAIN=true）中启动；
+    非调试模式（包括 WSGI 服务器的每个工作进程）直接启动。BACKGROUND_JOBS_ENABLED 为 false 时不启动
+    """
+    global _background_jobs_started
+    if _background_jobs_started or not app.config.get('BACKGROUND_JOBS_ENABLED', True):
+        return
+    if app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+    _background_jobs_started = True
+    
+    from utils.scheduler import start_periodic_job
+    from utils.activity_status import sync_activity_statuses
+    from utils.counters import reconcile_participant_counters_job
+    
+    interval = app.config.get('ACTIVITY_STATUS_SYNC_INTERVAL', 0)
+    if interval > 0:
+        start_periodic_job(app, 'activity-status-sync', interval, sync_activity_statuses)
+    
+    interval = app.config.get('COUNTER_RECONCILE_INTERVAL', 0)
+    if interval > 0:
+        start_periodic_job(app, 'counter-reconcile', interval, reconcile_participant_counters_job)
+
+
 if __name__ == '__main__':
     app = create_app()
     
@@ -81,5 +113,9 @@ if __name__ == '__main__':
         db.create_all()
         print("数据库表创建成功！")
     
+    # 调试模式运行（启用自动重载），后台任务只在提供服务的进程中启动
+    app.debug = True
+    start_background_jobs(app)
+    
     # 运行应用
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000)
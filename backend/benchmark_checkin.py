@@ -0,0 +1,150 @@
+"""
+签到码并发签到压力测试
+
+在临时数据库中创建一个进行中的活动、一批已报名的学生和一个签到码，启动多线程HTTP服务，
+由所有客户端同时提交签到码（模拟整个教室在一分钟内输入签到码），输出每秒签到数、
+每次签到执行的SQL语句数，并核对签到记录：
+  - 签到记录数 == 已签到的报名记录数 == 客户端数
+
+用法: python benchmark_checkin.py [并发客户端数，默认300] [每个客户端的签到次数，默认1]
+      每个客户端签到多次时使用不同的活动，每个活动一个签到码
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import datetime, timedelta
+
+# 必须在导入应用之前指定临时数据库
+_db_fd, DB_PATH = tempfile.mkstemp(suffix='.db')
+os.close(_db_fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from sqlalchemy import event, insert
+from werkzeug.serving import ThreadedWSGIServer
+from flask_jwt_extended import create_access_token
+from app import create_app
+from models import db, User, Activity, Registration, CheckIn, CheckInCode
+
+
+def seed(clients, rounds):
+    now = datetime.utcnow()
+    organizer = User(username='organizer1', email='organizer1@organizer.local', role='organizer',
+                     password_hash='-')
+    db.session.add(organizer)
+    db.session.flush()
+
+    db.session.execute(insert(User), [
+        {'username': f'{20240000 + i}', 'email': f'{20240000 + i}@student.local', 'role': 'student',
+         'password_hash': '-'}
+        for i in range(clients)
+    ])
+    student_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.role == 'student')]
+
+    codes = []
+    for round_number in range(rounds):
+        activity = Activity(
+            title=f'讲座{round_number + 1}', description='并发签到测试', category='academic',
+            organizer_id=organizer.id, start_time=now - timedelta(minutes=10), end_time=now + timedelta(hours=2),
+            location='报告厅', max_participants=clients, current_participants=clients,
+            registration_deadline=now - timedelta(days=1), images=[], tags=[], sub_items=[]
+        )
+        db.session.add(activity)
+        db.session.flush()
+        db.session.execute(insert(Registration), [
+            {'activity_id': activity.id, 'user_id': user_id, 'status': 'registered', 'registered_at': now}
+            for user_id in student_ids
+        ])
+        code = f'{100000 + round_number:06d}'
+        db.session.add(CheckInCode(activity_id=activity.id, code=code, expires_at=now + timedelta(minutes=30)))
+        codes.append((activity.id, code))
+    db.session.commit()
+
+    tokens = [create_access_token(identity=f'{user_id}_v1') for user_id in student_ids]
+    return codes, tokens
+
+
+def check_in(base_url, codes, token, barrier, results):
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    barrier.wait()
+    for activity_id, code in codes:
+        request = urllib.request.Request(
+            f'{base_url}/api/checkin/code', data=json.dumps({'activityId': activity_id, 'code': code}).encode(),
+            method='POST', headers=headers
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                results.append(response.status)
+        except urllib.error.HTTPError as e:
+            results.append((e.code, json.loads(e.read()).get('message')))
+        except Exception as e:
+            results.append(type(e).__name__)
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        codes, tokens = seed(clients, rounds)
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    # 监听队列需容纳所有同时到达的连接
+    server_class = type('BenchmarkServer', (ThreadedWSGIServer,), {'request_queue_size': clients})
+    server = server_class('127.0.0.1', 0, app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = []
+    barrier = threading.Barrier(clients + 1)
+    threads = [threading.Thread(target=check_in, args=(base_url, codes, token, barrier, results)) for token in tokens]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    executed = len(statements)
+
+    with app.app_context():
+        checkins = CheckIn.query.count()
+        checked_in = Registration.query.filter_by(status='checked_in').count()
+        db.engine.dispose()
+    os.remove(DB_PATH)
+
+    total = clients * rounds
+    outcomes = Counter(result if isinstance(result, (int, str)) else f'{result[0]} {result[1]}'
+                       for result in results)
+    succeeded = outcomes.get(200, 0)
+    consistent = checkins == checked_in == succeeded == total
+
+    print("=" * 60)
+    print(f"并发签到测试：{clients} 个客户端，每个签到 {rounds} 次")
+    print("=" * 60)
+    for outcome, count in sorted(outcomes.items(), key=lambda item: -item[1]):
+        print(f"  {outcome}: {count}")
+    print(f"总耗时: {elapsed:.2f} 秒")
+    print(f"签到吞吐: {succeeded / elapsed:.1f} 签到/秒")
+    print(f"每次签到执行SQL语句: {executed / total:.1f} 条")
+    print(f"签到记录: {checkins}，已签到报名: {checked_in}")
+    print("=" * 60)
+    if not consistent:
+        print("✗ 签到记录与报名状态不一致")
+        sys.exit(1)
+    print("✓ 签到记录与报名状态一致")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+签到批量提交（group commit）压力测试
+
+不经过HTTP，由多个线程直接执行签到的写入路径，对比两种提交方式的每秒签到数和提交次数：
+  - 逐条提交：每次签到 CheckIn.record 后单独提交（CHECKIN_GROUP_COMMIT_SIZE=0）
+  - 批量提交：签到放入 utils.checkin_writer 队列，等待所在批次提交完成
+两种方式使用不同的活动，结束后核对签到记录数 == 已签到的报名记录数 == 签到次数。
+端到端（含HTTP和JWT）的测试见 benchmark_checkin.py
+
+用法: python benchmark_checkin_writer.py [并发线程数，默认300] [每个线程的签到次数，默认3]
+      [每批最多签到数，默认200]
+"""
+import os
+import sys
+import threading
+import time
+
+# 导入时创建临时数据库并指定给应用
+from benchmark_checkin import DB_PATH, seed
+from sqlalchemy import event
+from app import create_app
+from models import db, CheckIn, Registration
+from utils import checkin_writer
+
+
+def check_in(app, user_id, activity_ids, group_commit, barrier, failures):
+    barrier.wait()
+    for activity_id in activity_ids:
+        with app.app_context():
+            try:
+                if group_commit:
+                    result = checkin_writer.submit(activity_id, user_id, 1, 'code')
+                else:
+                    result = CheckIn.record(activity_id, user_id, 1, 'code')
+                    db.session.commit()
+                if result is None:
+                    failures.append('校验不通过')
+            except Exception as e:
+                db.session.rollback()
+                failures.append(type(e).__name__)
+            finally:
+                db.session.remove()
+
+
+def run(app, engine, student_ids, activity_ids, group_commit):
+    commits = []
+    listener = lambda *args: commits.append(1)
+    event.listen(engine, 'commit', listener)
+    failures = []
+    barrier = threading.Barrier(len(student_ids) + 1)
+    threads = [threading.Thread(target=check_in, args=(app, user_id, activity_ids, group_commit, barrier, failures))
+               for user_id in student_ids]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    event.remove(engine, 'commit', listener)
+    return elapsed, len(commits), failures
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    app = create_app()
+    app.config['CHECKIN_GROUP_COMMIT_SIZE'] = batch_size
+
+    with app.app_context():
+        db.create_all()
+        codes, _ = seed(clients, rounds * 2)
+        student_ids = [user_id for (user_id,) in db.session.query(Registration.user_id).filter(
+            Registration.activity_id == codes[0][0]
+        )]
+        engine = db.engine
+    activity_ids = [activity_id for activity_id, _ in codes]
+
+    total = clients * rounds
+    print("=" * 60)
+    print(f"签到写入测试：{clients} 个线程，每个签到 {rounds} 次，每批最多 {batch_size} 条")
+    print("=" * 60)
+    consistent = True
+    for label, group_commit, activities in (('逐条提交', False, activity_ids[:rounds]),
+                                           ('批量提交', True, activity_ids[rounds:])):
+        elapsed, commits, failures = run(app, engine, student_ids, activities, group_commit)
+        with app.app_context():
+            checkins = CheckIn.query.filter(CheckIn.activity_id.in_(activities)).count()
+            checked_in = Registration.query.filter(
+                Registration.activity_id.in_(activities), Registration.status == 'checked_in'
+            ).count()
+        consistent = consistent and not failures and checkins == checked_in == total
+        print(f"{label}: {total / elapsed:.1f} 签到/秒，耗时 {elapsed:.2f} 秒，提交 {commits} 次，"
+              f"失败 {len(failures)} 次，签到记录 {checkins}，已签到报名 {checked_in}")
+
+    with app.app_context():
+        db.engine.dispose()
+    os.remove(DB_PATH)
+
+    print("=" * 60)
+    if not consistent:
+        print("✗ 签到记录与报名状态不一致")
+        sys.exit(1)
+    print("✓ 签到记录与报名状态一致")
+
+
+if __name__ == '__main__':
+    main()
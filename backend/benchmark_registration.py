@@ -0,0 +1,159 @@
+"""
+并发报名压力测试
+
+在临时数据库中创建一个活动和一批学生，启动多线程HTTP服务，
+由所有客户端同时发起报名请求，输出每秒报名数，并核对是否超员：
+  - 有效报名记录数 == 活动当前人数 <= 最大人数
+  - 子项目计数器 == 该子项目的有效报名记录数
+
+用法: python benchmark_registration.py [并发客户端数，默认500] [名额，默认为客户端数的一半] [direct|queued]
+      queued 模式下活动使用排队报名，客户端提交后轮询凭证直到得到处理结果
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from datetime import datetime, timedelta
+
+# 必须在导入应用之前指定临时数据库
+_db_fd, DB_PATH = tempfile.mkstemp(suffix='.db')
+os.close(_db_fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from sqlalchemy import insert
+from werkzeug.serving import ThreadedWSGIServer
+from flask_jwt_extended import create_access_token
+from app import create_app
+from models import db, User, Activity, ActivitySubItem, Registration
+
+SUB_ITEM = '单人'
+# 排队模式下客户端查询凭证的间隔（秒）
+POLL_INTERVAL = 0.2
+
+
+def seed(clients, seats, admission_mode):
+    now = datetime.utcnow()
+    organizer = User(username='organizer1', email='organizer1@organizer.local', role='organizer',
+                     password_hash='-')
+    db.session.add(organizer)
+    db.session.flush()
+
+    activity = Activity(
+        title='热门活动', description='并发报名测试', category='sports', organizer_id=organizer.id,
+        start_time=now + timedelta(days=2), end_time=now + timedelta(days=2, hours=2), location='体育馆',
+        max_participants=seats, registration_deadline=now + timedelta(days=1),
+        images=[], tags=[], sub_items=[{'name': SUB_ITEM}], admission_mode=admission_mode
+    )
+    db.session.add(activity)
+    db.session.flush()
+    activity.sync_sub_item_counters()
+
+    db.session.execute(insert(User), [
+        {'username': f'{20240000 + i}', 'email': f'{20240000 + i}@student.local', 'role': 'student',
+         'password_hash': '-'}
+        for i in range(clients)
+    ])
+    db.session.commit()
+
+    student_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.role == 'student')]
+    tokens = [create_access_token(identity=f'{user_id}_v1') for user_id in student_ids]
+    return activity.id, tokens
+
+
+def register(base_url, activity_id, token, barrier, results):
+    headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    request = urllib.request.Request(
+        f'{base_url}/api/registrations/{activity_id}', data=json.dumps({'subItem': SUB_ITEM}).encode(),
+        method='POST', headers=headers
+    )
+    barrier.wait()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            status, body = response.status, json.loads(response.read())
+        # 排队模式：轮询凭证直到处理完成
+        while status == 202:
+            time.sleep(POLL_INTERVAL)
+            ticket_url = f"{base_url}/api/registrations/tickets/{body['data']['ticket']}"
+            with urllib.request.urlopen(urllib.request.Request(ticket_url, headers=headers),
+                                        timeout=120) as response:
+                ticket = json.loads(response.read())['data']
+            if ticket['status'] == 'succeeded':
+                status = 201
+            elif ticket['status'] == 'failed':
+                status = (400, ticket['message'])
+        results.append(status)
+    except urllib.error.HTTPError as e:
+        results.append((e.code, json.loads(e.read()).get('message')))
+    except Exception as e:
+        results.append(type(e).__name__)
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    seats = int(sys.argv[2]) if len(sys.argv) > 2 else clients // 2
+    admission_mode = sys.argv[3] if len(sys.argv) > 3 else 'direct'
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        activity_id, tokens = seed(clients, seats, admission_mode)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    # 监听队列需容纳所有同时到达的连接
+    server_class = type('BenchmarkServer', (ThreadedWSGIServer,), {'request_queue_size': clients})
+    server = server_class('127.0.0.1', 0, app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = []
+    barrier = threading.Barrier(clients + 1)
+    threads = [threading.Thread(target=register, args=(base_url, activity_id, token, barrier, results)) for token in tokens]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    with app.app_context():
+        activity = db.session.get(Activity, activity_id)
+        registered = Registration.query.filter(
+            Registration.activity_id == activity_id, Registration.status != 'cancelled'
+        ).count()
+        counter = ActivitySubItem.query.filter_by(activity_id=activity_id, name=SUB_ITEM).first()
+        current, maximum, sub_item_count = activity.current_participants, activity.max_participants, \
+            counter.current_participants
+        db.engine.dispose()
+    os.remove(DB_PATH)
+
+    outcomes = Counter(result if isinstance(result, (int, str)) else f'{result[0]} {result[1]}'
+                       for result in results)
+    succeeded = outcomes.get(201, 0)
+    consistent = registered == current == sub_item_count == succeeded and current <= maximum
+
+    print("=" * 60)
+    print(f"并发报名测试：{clients} 个客户端，{seats} 个名额，报名方式 {admission_mode}")
+    print("=" * 60)
+    for outcome, count in sorted(outcomes.items(), key=lambda item: -item[1]):
+        print(f"  {outcome}: {count}")
+    print(f"总耗时: {elapsed:.2f} 秒")
+    print(f"请求吞吐: {clients / elapsed:.1f} 请求/秒")
+    print(f"报名成功: {succeeded / elapsed:.1f} 报名/秒")
+    print(f"有效报名记录: {registered}，活动当前人数: {current}/{maximum}，子项目计数: {sub_item_count}")
+    print("=" * 60)
+    if not consistent:
+        print("✗ 报名人数不一致或超员")
+        sys.exit(1)
+    print("✓ 没有超员，计数与报名记录一致")
+
+
+if __name__ == '__main__':
+    main()
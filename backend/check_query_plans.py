@@ -0,0 +1,314 @@
+"""
+查询计划检查工具
+
+在临时数据库上依次调用各路由模块的接口并执行一次后台定时任务，记录执行过的每条查询，
+对其运行 EXPLAIN QUERY PLAN，发现全表扫描（包括不带条件地遍历整个索引）时以非零状态退出
+
+用法: python check_query_plans.py
+"""
+import io
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# 必须在导入应用之前指定临时数据库
+_db_fd, DB_PATH = tempfile.mkstemp(suffix='.db')
+os.close(_db_fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from sqlalchemy import event, update
+from flask_jwt_extended import create_access_token
+from app import create_app
+from models import db, User, Activity, Registration, CheckIn, CheckInCode, Credential
+from utils import checkin_qr
+from utils.activity_status import sync_activity_statuses
+from utils.counters import reconcile_participant_counters_job
+
+_PAGED_BY_CREATED = '按创建时间倒序分页，沿 ix_activities_created 遍历，取够一页即停止'
+
+# 本身就需要遍历整张表（或整个索引）的查询：(请求名称, 表名) -> 原因
+ALLOWED_SCANS = {
+    ('活动列表', 'activities'): _PAGED_BY_CREATED + '；不带筛选条件的总数需要计数全部活动',
+    ('活动列表-未开始', 'activities'): _PAGED_BY_CREATED,
+    ('活动列表-进行中', 'activities'): _PAGED_BY_CREATED,
+    ('活动列表-已结束', 'activities'): _PAGED_BY_CREATED,
+    ('活动列表-关键词', 'activities'): '标题模糊搜索 LIKE %keyword% 无法使用索引',
+    ('管理员-组织者列表', 'users'): '管理后台低频操作，按角色列出全部组织者',
+    ('管理员-导出活动', 'activities'): '管理后台低频操作，导出全部活动',
+    ('修改资料', 'users'): '低频操作，检查邮箱是否被占用',
+    ('定时任务-参与人数核对', 'activities'): '定时核对所有活动的参与人数',
+    ('定时任务-参与人数核对', 'registrations'): '定时核对按活动分组统计全部有效报名',
+}
+
+# SCAN 表示遍历整张表，USING [COVERING] INDEX 时为按索引顺序遍历整个索引，同样是全量扫描；
+# 带条件的索引查找显示为 SEARCH
+SCAN_PATTERN = re.compile(r'^SCAN (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX \w+)?$')
+# 查询计划中使用别名代替表名，按语句中的 "表名 AS 别名" 还原
+ALIAS_PATTERN = re.compile(r'\b(\w+) AS (\w+)\b')
+
+
+def seed():
+    """写入覆盖各接口所需的测试数据"""
+    now = datetime.utcnow()
+
+    organizer = User(username='organizer1', email='organizer1@organizer.local', role='organizer', name='组织者')
+    organizer.set_password('123456')
+    # 供管理员停用/删除等操作使用，避免影响其他请求的登录状态
+    other_organizer = User(username='organizer2', email='organizer2@organizer.local', role='organizer', name='组织者2')
+    other_organizer.set_password('123456')
+    db.session.add_all([organizer, other_organizer])
+
+    students = []
+    for i in range(1, 6):
+        student = User(username=f'2024{i:04d}', email=f'2024{i:04d}@student.local', role='student')
+        student.set_password('123456')
+        credential = Credential(account_id=student.username, name=f'学生{i}')
+        credential.set_password('123456')
+        db.session.add_all([student, credential])
+        students.append(student)
+    db.session.flush()
+
+    activities = []
+    for i, (start, end) in enumerate([
+        (now + timedelta(days=3), now + timedelta(days=3, hours=2)),   # 未开始
+        (now - timedelta(hours=1), now + timedelta(hours=1)),          # 进行中
+        (now - timedelta(days=3), now - timedelta(days=3, hours=-2)),  # 已结束
+        (now + timedelta(days=5), now + timedelta(days=5, hours=2)),   # 排队报名
+    ]):
+        activity = Activity(
+            title=f'测试活动{i}',
+            description='查询计划检查',
+            category='sports',
+            organizer_id=organizer.id,
+            start_time=start,
+            end_time=end,
+            location='体育馆',
+            max_participants=50,
+            registration_deadline=start + timedelta(days=1),
+            images=[],
+            tags=['热门'],
+            sub_items=[{'name': '男双'}, {'name': '女双'}]
+        )
+        activity.status = Activity.lifecycle_status(start, end)
+        if i == 3:
+            activity.admission_mode = 'queued'
+        db.session.add(activity)
+        activities.append(activity)
+    db.session.flush()
+
+    for activity in activities:
+        activity.sync_sub_item_counters()
+        activity.sync_tags()
+        for student in students[1:]:
+            db.session.add(Registration(activity_id=activity.id, user_id=student.id,
+                                        status='registered', sub_item='男双'))
+            activity.current_participants += 1
+    db.session.add(CheckIn(activity_id=activities[2].id, user_id=students[1].id, method='code'))
+    db.session.add(CheckInCode(activity_id=activities[1].id, code='135790',
+                               expires_at=now + timedelta(minutes=15)))
+    db.session.commit()
+
+    return ([organizer.id, other_organizer.id], [student.id for student in students],
+            [activity.id for activity in activities])
+
+
+def build_requests(organizer_ids, student_ids, activity_ids):
+    """按执行顺序列出要检查的请求：(名称, 方法, URL, 请求参数)"""
+    organizer_id, other_organizer_id = organizer_ids
+    upcoming, ongoing, completed, queued = activity_ids
+    tokens = {
+        'organizer': create_access_token(identity=f'{organizer_id}_v1'),
+        'student': create_access_token(identity=f'{student_ids[0]}_v1'),
+        'registered': create_access_token(identity=f'{student_ids[1]}_v1'),
+        'registered_qr': create_access_token(identity=f'{student_ids[2]}_v1'),
+        'registered_batch': create_access_token(identity=f'{student_ids[3]}_v1'),
+        'admin': create_access_token(identity='admin_0'),
+    }
+    auth = {role: {'Authorization': f'Bearer {token}'} for role, token in tokens.items()}
+    admin = {'adminAccount': 'admin', 'adminPassword': 'admin123'}
+    new_activity = {
+        'title': '新活动', 'description': '描述', 'category': 'academic',
+        'startTime': '2099-01-01T10:00:00Z', 'endTime': '2099-01-01T12:00:00Z',
+        'location': '教学楼', 'maxParticipants': 10, 'registrationDeadline': '2098-12-31T00:00:00Z',
+        'tags': ['讲座'], 'subItems': [{'name': 'A'}]
+    }
+
+    return [
+        # 认证
+        ('组织者登录', 'POST', '/api/auth/login', {'json': {'account': 'organizer1', 'password': '123456'}}),
+        ('学生登录', 'POST', '/api/auth/login', {'json': {'account': '20240001', 'password': '123456'}}),
+        ('当前用户', 'GET', '/api/auth/me', {'headers': auth['student']}),
+        ('修改资料', 'PUT', '/api/auth/profile', {'headers': auth['student'], 'json': {'avatar': '/a.png', 'email': 'new@student.local'}}),
+        ('管理员-组织者列表', 'GET', '/api/auth/admin/organizers', {'query_string': admin}),
+        ('管理员-创建组织者', 'POST', '/api/auth/admin/create-organizer',
+         {'json': dict(admin, account='organizer3', password='123456', name='组织者3')}),
+        ('管理员-停用组织者', 'POST', '/api/auth/admin/toggle-organizer-status',
+         {'json': dict(admin, organizerId=other_organizer_id)}),
+        ('管理员-修改组织者密码', 'POST', '/api/auth/admin/change-organizer-password',
+         {'json': dict(admin, organizerId=other_organizer_id, newPassword='654321')}),
+        # 活动
+        ('活动列表', 'GET', '/api/activities', {}),
+        ('活动列表-分类', 'GET', '/api/activities', {'query_string': {'category': 'sports'}}),
+        ('活动列表-未开始', 'GET', '/api/activities', {'query_string': {'status': 'upcoming'}}),
+        ('活动列表-进行中', 'GET', '/api/activities', {'query_string': {'status': 'ongoing'}}),
+        ('活动列表-已结束', 'GET', '/api/activities', {'query_string': {'status': 'completed'}}),
+        ('活动列表-关键词', 'GET', '/api/activities', {'query_string': {'keyword': '测试'}}),
+        ('活动列表-标签', 'GET', '/api/activities', {'query_string': {'tag': '热门'}}),
+        ('活动列表-日期', 'GET', '/api/activities',
+         {'query_string': {'startDate': datetime.utcnow().date().isoformat()}}),
+        ('活动详情', 'GET', f'/api/activities/{upcoming}', {}),
+        ('我创建的活动', 'GET', '/api/activities/my', {'headers': auth['organizer']}),
+        ('创建活动', 'POST', '/api/activities', {'headers': auth['organizer'], 'json': new_activity}),
+        ('修改活动', 'PUT', f'/api/activities/{upcoming}',
+         {'headers': auth['organizer'], 'json': {'title': '修改后', 'tags': ['推荐'], 'subItems': [{'name': '混双'}]}}),
+        ('管理员-导出活动', 'GET', '/api/activities/admin/export', {'headers': auth['admin']}),
+        ('管理员-缓存统计', 'GET', '/api/activities/admin/cache-stats', {'headers': auth['admin']}),
+        # 报名
+        ('报名', 'POST', f'/api/registrations/{upcoming}', {'headers': auth['student'], 'json': {'subItem': '混双'}}),
+        ('报名状态', 'GET', f'/api/registrations/status/{upcoming}', {'headers': auth['student']}),
+        ('批量报名状态', 'GET', f'/api/registrations/status?ids={upcoming},{ongoing},{completed},{queued}',
+         {'headers': auth['student']}),
+        ('我的报名', 'GET', '/api/registrations/my', {'headers': auth['student']}),
+        ('我的报名-游标分页', 'GET', '/api/registrations/my?cursor=&view=summary', {'headers': auth['student']}),
+        ('活动报名列表', 'GET', f'/api/registrations/activity/{upcoming}', {'headers': auth['organizer']}),
+        ('导入报名名单', 'POST', f'/api/registrations/activity/{upcoming}/import',
+         {'headers': auth['organizer'], 'content_type': 'multipart/form-data',
+          'data': {'file': (io.BytesIO('学号,子项目\n20240001,混双\n20240002,\n'.encode()), 'roster.csv')}}),
+        ('取消报名', 'DELETE', f'/api/registrations/{upcoming}', {'headers': auth['student']}),
+        ('排队报名', 'POST', f'/api/registrations/{queued}', {'headers': auth['student'], 'json': {'subItem': '男双'}}),
+        # 签到
+        ('生成签到码', 'POST', f'/api/checkin/generate-code/{ongoing}', {'headers': auth['organizer'], 'json': {'duration': 10}}),
+        ('生成签到二维码', 'POST', f'/api/checkin/generate-qr/{ongoing}', {'headers': auth['organizer']}),
+        ('签到码签到', 'POST', '/api/checkin/code',
+         {'headers': auth['registered'], 'json': {'activityId': ongoing, 'code': '135790'}}),
+        ('二维码签到', 'POST', '/api/checkin/qrcode',
+         {'headers': auth['registered_qr'], 'json': {'activityId': ongoing, 'qrData': checkin_qr.generate(ongoing)[0]}}),
+        ('签到码签到-批量提交', 'POST', '/api/checkin/code',
+         {'headers': auth['registered_batch'], 'json': {'activityId': ongoing, 'code': '135790'},
+          'config': {'CHECKIN_GROUP_COMMIT_SIZE': 10}}),
+        ('离线签到同步', 'POST', f'/api/checkin/bulk/{ongoing}',
+         {'headers': auth['organizer'], 'json': {'records': [
+             {'userId': user_id, 'scannedAt': datetime.utcnow().isoformat() + 'Z', 'method': 'qrcode'}
+             for user_id in student_ids
+         ]}}),
+        ('签到列表', 'GET', f'/api/checkin/activity/{ongoing}', {'headers': auth['organizer']}),
+        ('签到统计', 'GET', f'/api/checkin/stats/{ongoing}', {'headers': auth['organizer']}),
+        ('我的最近签到', 'GET', '/api/checkin/my-recent', {'headers': auth['registered']}),
+        ('结束签到', 'POST', f'/api/checkin/end-checkin/{ongoing}', {'headers': auth['organizer']}),
+        # 统计
+        ('活动统计', 'GET', f'/api/statistics/activity/{ongoing}', {'headers': auth['organizer']}),
+        ('组织者统计', 'GET', '/api/statistics/organizer', {'headers': auth['organizer']}),
+        ('导出签到统计', 'GET', f'/api/statistics/export/{completed}', {'headers': auth['organizer']}),
+        ('导出报名统计', 'GET', f'/api/statistics/export/{upcoming}', {'headers': auth['organizer']}),
+        ('报名趋势', 'GET', '/api/statistics/trend',
+         {'headers': auth['organizer'], 'query_string': {'startDate': '2000-01-01', 'endDate': '2100-01-01'}}),
+        # 删除
+        ('删除活动', 'DELETE', f'/api/activities/{upcoming}', {'headers': auth['organizer']}),
+        ('管理员-删除活动', 'DELETE', f'/api/activities/admin/{completed}', {'headers': auth['admin']}),
+        ('管理员-删除组织者', 'POST', '/api/auth/admin/delete-organizer',
+         {'json': dict(admin, organizerId=other_organizer_id)}),
+    ]
+
+
+def build_jobs(activity_ids):
+    """列出要检查的后台定时任务：(名称, 无参数函数)"""
+    ongoing = activity_ids[1]
+
+    def reconcile():
+        # 制造一个参与人数偏差，使修正语句也被执行
+        db.session.execute(update(Activity).where(Activity.id == ongoing).values(
+            current_participants=Activity.current_participants + 1
+        ))
+        db.session.commit()
+        reconcile_participant_counters_job()
+
+    return [
+        ('定时任务-活动状态同步', sync_activity_statuses),
+        ('定时任务-参与人数核对', reconcile),
+    ]
+
+
+def find_full_scans(conn, statement, parameters):
+    """返回查询计划中被全量扫描的 (表名, 计划明细) 列表"""
+    plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    tables = set(db.metadata.tables)
+    aliases = {alias: table for table, alias in ALIAS_PATTERN.findall(statement) if table in tables}
+    scans = []
+    for row in plan:
+        match = SCAN_PATTERN.match(row[-1])
+        if match:
+            table = aliases.get(match.group(1), match.group(1))
+            if table in tables:
+                scans.append((table, row[-1]))
+    return scans
+
+
+def main():
+    app = create_app()
+    client = app.test_client()
+    current = {'name': None}
+    statements = []
+
+    with app.app_context():
+        db.create_all()
+        organizer_ids, student_ids, activity_ids = seed()
+        requests_to_check = build_requests(organizer_ids, student_ids, activity_ids)
+        jobs = build_jobs(activity_ids)
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if current['name'] and not executemany and not statement.lstrip().upper().startswith('INSERT'):
+                statements.append((current['name'], statement, parameters))
+
+    failed_requests = []
+    for name, method, url, kwargs in requests_to_check:
+        current['name'] = name
+        # 'config' 为只在该请求期间生效的配置
+        overrides = kwargs.pop('config', {})
+        saved = {key: app.config[key] for key in overrides}
+        app.config.update(overrides)
+        response = client.open(url, method=method, **kwargs)
+        app.config.update(saved)
+        if response.status_code >= 400:
+            failed_requests.append(f'{name}: {method} {url} -> {response.status_code}')
+    for name, job in jobs:
+        current['name'] = name
+        with app.app_context():
+            job()
+    current['name'] = None
+
+    failures = []
+    checked = set()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for name, statement, parameters in statements:
+                if (name, statement) in checked:
+                    continue
+                checked.add((name, statement))
+                for table, detail in find_full_scans(conn, statement, parameters):
+                    reason = ALLOWED_SCANS.get((name, table))
+                    if reason:
+                        print(f"[允许] {name}: {detail}（{reason}）")
+                    else:
+                        failures.append((name, detail, statement))
+
+    print("=" * 60)
+    print(f"共检查 {len(requests_to_check)} 个请求, {len(jobs)} 个定时任务, {len(checked)} 条查询")
+    for message in failed_requests:
+        print(f"[警告] 请求失败，查询覆盖可能不完整: {message}")
+    for name, detail, statement in failures:
+        print(f"\n[全表扫描] {name}: {detail}")
+        print(f"  {' '.join(statement.split())}")
+    print("=" * 60)
+
+    os.remove(DB_PATH)
+    if failures or failed_requests:
+        print("✗ 查询计划检查未通过")
+        sys.exit(1)
+    print("✓ 所有查询均使用了索引")
+
+
+if __name__ == '__main__':
+    main()
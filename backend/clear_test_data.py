@@ -3,7 +3,8 @@
 可以选择性地清理签到记录、报名记录等
 """
 from app import create_app
-from models import db, CheckIn, Registration, Activity
+from models import db, CheckIn, Registration, Activity, ActivitySubItem
+from utils.counters import rebuild_sub_item_counters
 
 app = create_app()
 
@@ -27,6 +28,8 @@ def reset_activity_participants():
         activities = Activity.query.all()
         for activity in activities:
             activity.current_participants = 0
+            activity.counters_version += 1
+        ActivitySubItem.query.update({'current_participants': 0})
         db.session.commit()
         print(f"✓ 已重置 {len(activities)} 个活动的参与人数")
 
@@ -42,6 +45,7 @@ def clear_specific_user_data(username):
         checkin_count = CheckIn.query.filter_by(user_id=user.id).delete()
         reg_count = Registration.query.filter_by(user_id=user.id).delete()
         db.session.commit()
+        rebuild_sub_item_counters()
         print(f"✓ 已删除用户 {username} 的 {checkin_count} 条签到记录和 {reg_count} 条报名记录")
 
 def main():
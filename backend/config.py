@@ -15,3 +15,45 @@ class Config:
     
     # CORS 配置
     CORS_HEADERS = 'Content-Type'
+    
+    # 是否在服务进程中启动后台任务（多进程部署时可以只在一个进程中启用）
+    BACKGROUND_JOBS_ENABLED = os.environ.get('BACKGROUND_JOBS_ENABLED', 'true').lower() == 'true'
+    
+    # 后台任务配置（秒，0表示不启用）
+    ACTIVITY_STATUS_SYNC_INTERVAL = int(os.environ.get('ACTIVITY_STATUS_SYNC_INTERVAL', 60))
+    COUNTER_RECONCILE_INTERVAL = int(os.environ.get('COUNTER_RECONCILE_INTERVAL', 3600))
+    
+    # 公开活动目录响应缓存的最大条目数（0表示不启用）
+    ACTIVITY_CACHE_SIZE = int(os.environ.get('ACTIVITY_CACHE_SIZE', 512))
+    
+    # 签到二维码：签名密钥（多节点部署时需一致）、轮换周期（秒）、轮换后仍接受的之前窗口数
+    CHECKIN_QR_SECRET = os.environ.get('CHECKIN_QR_SECRET') or SECRET_KEY
+    CHECKIN_QR_ROTATION = int(os.environ.get('CHECKIN_QR_ROTATION', 30))
+    CHECKIN_QR_GRACE_WINDOWS = int(os.environ.get('CHECKIN_QR_GRACE_WINDOWS', 1))
+    
+    # 签到批量提交：每批最多的签到数（0表示不启用，每次签到单独提交）、攒批的最长等待时间（毫秒）、
+    # 请求等待所在批次提交的超时时间（秒）
+    CHECKIN_GROUP_COMMIT_SIZE = int(os.environ.get('CHECKIN_GROUP_COMMIT_SIZE', 0))
+    CHECKIN_GROUP_COMMIT_DELAY_MS = int(os.environ.get('CHECKIN_GROUP_COMMIT_DELAY_MS', 5))
+    CHECKIN_GROUP_COMMIT_TIMEOUT = int(os.environ.get('CHECKIN_GROUP_COMMIT_TIMEOUT', 10))
+    
+    # 离线签到批量同步单次最多的扫描记录数
+    CHECKIN_BULK_MAX_RECORDS = int(os.environ.get('CHECKIN_BULK_MAX_RECORDS', 5000))
+    
+    # 幂等键：保存的响应条数上限（0表示不启用）和有效期（秒）
+    IDEMPOTENCY_STORE_SIZE = int(os.environ.get('IDEMPOTENCY_STORE_SIZE', 10000))
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 3600))
+    
+    # 排队报名：每批提交的最大请求数、队列上限、处理结果保留时间（秒）
+    REGISTRATION_QUEUE_BATCH_SIZE = int(os.environ.get('REGISTRATION_QUEUE_BATCH_SIZE', 100))
+    REGISTRATION_QUEUE_MAX_SIZE = int(os.environ.get('REGISTRATION_QUEUE_MAX_SIZE', 10000))
+    REGISTRATION_TICKET_TTL = int(os.environ.get('REGISTRATION_TICKET_TTL', 600))
+    
+    # 报名名单批量导入的最大行数
+    ROSTER_IMPORT_MAX_ROWS = int(os.environ.get('ROSTER_IMPORT_MAX_ROWS', 5000))
+    
+    # 报名时间冲突检查：off 不检查，warn 允许报名并在响应中提示，reject 拒绝报名
+    SCHEDULE_CONFLICT_MODE = os.environ.get('SCHEDULE_CONFLICT_MODE', 'warn')
+    
+    # 批量查询报名状态时单次最多的活动数
+    REGISTRATION_STATUS_MAX_IDS = int(os.environ.get('REGISTRATION_STATUS_MAX_IDS', 100))
@@ -139,13 +139,16 @@ def init_database():
                 max_participants=template['max_participants'],
                 current_participants=0,
                 registration_deadline=registration_deadline,
-                tags='["热门", "推荐"]' if i % 2 == 0 else '["精选"]'
+                tags=['热门', '推荐'] if i % 2 == 0 else ['精选']
             )
             activities.append(activity)
             db.session.add(activity)
         
         print(f"创建了 {len(activities)} 个示例活动")
         
+        db.session.flush()
+        for activity in activities:
+            activity.sync_tags()
         db.session.commit()
         
         print("\n" + "="*50)
@@ -0,0 +1,25 @@
+"""
+数据库迁移脚本：为 activities 表添加时间范围索引，并按时间修正已存储的活动状态
+"""
+from app import create_app
+from models import db, Activity
+from utils.activity_status import sync_activity_statuses
+
+
+def migrate():
+    app = create_app()
+    
+    with app.app_context():
+        for index in Activity.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+            print(f"✓ 索引 {index.name} 已就绪")
+        
+        result = sync_activity_statuses()
+        print(f"✓ 活动状态已修正: 未开始 {result['upcoming']} 个, "
+              f"进行中 {result['ongoing']} 个, 已结束 {result['completed']} 个")
+        
+        print("\n数据库迁移完成！")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,25 @@
+"""
+数据库迁移脚本：创建 activity_tags 标签索引表，并根据已有活动的 tags 回填
+"""
+from app import create_app
+from models import db, Activity, ActivityTag
+
+
+def migrate():
+    app = create_app()
+    
+    with app.app_context():
+        ActivityTag.__table__.create(db.engine, checkfirst=True)
+        print("✓ activity_tags 表已就绪")
+        
+        activities = Activity.query.filter(Activity.tags.isnot(None)).all()
+        for activity in activities:
+            activity.sync_tags()
+        db.session.commit()
+        print(f"✓ 已同步 {len(activities)} 个活动的标签索引")
+        
+        print("\n数据库迁移完成！")
+
+
+if __name__ == '__main__':
+    migrate()
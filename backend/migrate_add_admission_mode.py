@@ -0,0 +1,30 @@
+"""
+数据库迁移脚本：为 activities 表添加 admission_mode 列（报名方式：direct 直接报名 / queued 排队报名）
+"""
+from sqlalchemy import text
+from app import create_app
+from models import db
+
+
+def migrate():
+    app = create_app()
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            result = conn.execute(text(
+                "SELECT COUNT(*) FROM pragma_table_info('activities') WHERE name='admission_mode'"
+            ))
+            if result.scalar() == 0:
+                conn.execute(text(
+                    "ALTER TABLE activities ADD COLUMN admission_mode VARCHAR(20) NOT NULL DEFAULT 'direct'"
+                ))
+                conn.commit()
+                print("✓ 已添加 activities.admission_mode 列")
+            else:
+                print("✓ activities.admission_mode 列已存在")
+
+        print("\n数据库迁移完成！")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,30 @@
+"""
+数据库迁移脚本：为 activities 表添加 counters_version 列（子项目计数器版本号，用于生成ETag）
+"""
+from sqlalchemy import text
+from app import create_app
+from models import db
+
+
+def migrate():
+    app = create_app()
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            result = conn.execute(text(
+                "SELECT COUNT(*) FROM pragma_table_info('activities') WHERE name='counters_version'"
+            ))
+            if result.scalar() == 0:
+                conn.execute(text(
+                    "ALTER TABLE activities ADD COLUMN counters_version INTEGER NOT NULL DEFAULT 0"
+                ))
+                conn.commit()
+                print("✓ 已添加 activities.counters_version 列")
+            else:
+                print("✓ activities.counters_version 列已存在")
+
+        print("\n数据库迁移完成！")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,34 @@
+"""
+数据库迁移脚本：为已有的 SQLite 数据库补建 models.py 中声明的所有表和索引
+"""
+from app import create_app
+from models import db
+
+
+def migrate():
+    app = create_app()
+    
+    with app.app_context():
+        # 创建缺失的表（新表会同时创建其索引）
+        db.create_all()
+        
+        inspector = db.inspect(db.engine)
+        for table in db.metadata.sorted_tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing:
+                    print(f"✓ 索引 {index.name} 已存在")
+                else:
+                    index.create(db.engine)
+                    print(f"✓ 已创建索引 {index.name}")
+        
+        # 更新查询规划器的统计信息
+        with db.engine.connect() as conn:
+            conn.execute(db.text("ANALYZE"))
+            conn.commit()
+        
+        print("\n数据库迁移完成！")
+
+
+if __name__ == '__main__':
+    migrate()
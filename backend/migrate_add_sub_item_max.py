@@ -0,0 +1,78 @@
+"""
+数据库迁移脚本：为 activity_sub_items 表添加 max_participants 列（子项目人数上限，为空时不限），
+并按活动 sub_items 中已有的 maxParticipants（兼容旧的 max）回填。
+
+报名时按计数器行占用子项目名额，没有计数器行的子项目无法报名，
+因此同时为升级前创建的活动补建缺失的计数器行，计数按未取消的报名记录统计
+"""
+from sqlalchemy import text
+from app import create_app
+from models import db
+
+
+def migrate():
+    app = create_app()
+
+    with app.app_context():
+        # 升级前没有计数器表的数据库先建表
+        db.create_all()
+        
+        with db.engine.connect() as conn:
+            result = conn.execute(text(
+                "SELECT COUNT(*) FROM pragma_table_info('activity_sub_items') WHERE name='max_participants'"
+            ))
+            if result.scalar() == 0:
+                conn.execute(text("ALTER TABLE activity_sub_items ADD COLUMN max_participants INTEGER"))
+                conn.commit()
+                print("✓ 已添加 activity_sub_items.max_participants 列")
+            else:
+                print("✓ activity_sub_items.max_participants 列已存在")
+
+            result = conn.execute(text("""
+                UPDATE activity_sub_items SET max_participants = (
+                    SELECT COALESCE(json_extract(item.value, '$.maxParticipants'), json_extract(item.value, '$.max'))
+                    FROM activities, json_each(activities.sub_items) AS item
+                    WHERE activities.id = activity_sub_items.activity_id
+                      AND item.type = 'object'
+                      AND json_extract(item.value, '$.name') = activity_sub_items.name
+                )
+                WHERE max_participants IS NULL
+            """))
+            conn.commit()
+            print(f"✓ 已回填子项目人数上限（检查 {result.rowcount} 个子项目）")
+
+            # 补建缺失的计数器行，并递增这些活动的计数器版本号使客户端缓存的ETag失效
+            missing = """
+                FROM activities, json_each(activities.sub_items) AS item
+                WHERE item.type = 'object'
+                  AND json_extract(item.value, '$.name') IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM activity_sub_items
+                      WHERE activity_sub_items.activity_id = activities.id
+                        AND activity_sub_items.name = json_extract(item.value, '$.name')
+                  )
+            """
+            conn.execute(text(f"""
+                UPDATE activities SET counters_version = counters_version + 1
+                WHERE id IN (SELECT activities.id {missing})
+            """))
+            result = conn.execute(text(f"""
+                INSERT INTO activity_sub_items (activity_id, name, current_participants, max_participants)
+                SELECT activities.id, json_extract(item.value, '$.name'), (
+                           SELECT COUNT(*) FROM registrations
+                           WHERE registrations.activity_id = activities.id
+                             AND registrations.sub_item = json_extract(item.value, '$.name')
+                             AND registrations.status != 'cancelled'
+                       ),
+                       COALESCE(json_extract(item.value, '$.maxParticipants'), json_extract(item.value, '$.max'))
+                {missing}
+                ON CONFLICT (activity_id, name) DO NOTHING
+            """))
+            conn.commit()
+            print(f"✓ 已补建 {result.rowcount} 个缺失的子项目计数器")
+
+        print("\n数据库迁移完成！")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,19 @@
+"""
+数据库迁移脚本：创建 waitlist_entries 候补名单表
+"""
+from app import create_app
+from models import db, WaitlistEntry
+
+
+def migrate():
+    app = create_app()
+    
+    with app.app_context():
+        WaitlistEntry.__table__.create(db.engine, checkfirst=True)
+        print("✓ waitlist_entries 表已就绪")
+        
+        print("\n数据库迁移完成！")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -1,9 +1,34 @@
-from datetime import datetime
+import json
+from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, select, bindparam, update, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+
+class JSONText(db.TypeDecorator):
+    """
+    以JSON文本存储的列类型
+    
+    写入时序列化，从数据库加载时解析一次，之后实例属性直接保存解析后的Python对象。
+    注意：原地修改列表/字典不会被检测到，需要重新赋值
+    """
+    impl = db.Text
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return json.dumps(value)
+    
+    def process_result_value(self, value, dialect):
+        if not value:
+            return None
+        return json.loads(value)
+
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -19,6 +44,8 @@ class User(db.Model):
     password_version = db.Column(db.Integer, default=1, nullable=False)  # 密码版本，用于使旧token失效
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (db.Index('ix_users_username_role_deleted', 'username', 'role', 'is_deleted'),)
+    
     # 关系
     activities = db.relationship('Activity', backref='organizer', lazy=True, cascade='all, delete-orphan')
     registrations = db.relationship('Registration', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -47,6 +74,9 @@ class User(db.Model):
 class Activity(db.Model):
     __tablename__ = 'activities'
     
+    # 报名方式：direct 直接写入；queued 进入队列由后台批量处理（热门活动）
+    ADMISSION_MODES = ('direct', 'queued')
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -54,70 +84,370 @@ class Activity(db.Model):
     status = db.Column(db.String(20), default='upcoming')  # upcoming, ongoing, completed, cancelled
     organizer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
-    end_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False, index=True)
     location = db.Column(db.String(200), nullable=False)
     max_participants = db.Column(db.Integer, nullable=False)
     current_participants = db.Column(db.Integer, default=0)
     registration_deadline = db.Column(db.DateTime, nullable=False)
     cover_image = db.Column(db.String(255))
-    images = db.Column(db.Text)  # JSON string array of image URLs
-    tags = db.Column(db.Text)  # JSON string
-    sub_items = db.Column(db.Text)  # JSON string for sub-items like "男双", "女双", "混双"
+    images = db.Column(JSONText)  # JSON array of image URLs
+    tags = db.Column(JSONText)  # JSON array of tags
+    sub_items = db.Column(JSONText)  # JSON array for sub-items like "男双", "女双", "混双"
+    counters_version = db.Column(db.Integer, default=0, nullable=False)  # 子项目计数器每次变化时递增
+    admission_mode = db.Column(db.String(20), default='direct', nullable=False)  # direct, queued
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 按时间范围筛选活动状态时使用的索引
+    __table_args__ = (
+        db.Index('ix_activities_start_end', 'start_time', 'end_time'),
+        db.Index('ix_activities_organizer_created', 'organizer_id', 'created_at'),
+        db.Index('ix_activities_category_created', 'category', 'created_at'),
+        db.Index('ix_activities_created', 'created_at'),
+    )
+    
     # 关系
     registrations = db.relationship('Registration', backref='activity', lazy=True, cascade='all, delete-orphan')
     checkins = db.relationship('CheckIn', backref='activity', lazy=True, cascade='all, delete-orphan')
+    sub_item_counters = db.relationship('ActivitySubItem', backref='activity', lazy=True, cascade='all, delete-orphan')
+    tag_index = db.relationship('ActivityTag', backref='activity', lazy=True, cascade='all, delete-orphan')
+    waitlist = db.relationship('WaitlistEntry', backref='activity', lazy=True, cascade='all, delete-orphan')
     
     def to_dict(self):
-        import json
-        # 根据时间动态计算活动状态
-        now = datetime.utcnow()
-        if self.status == 'cancelled':
-            actual_status = 'cancelled'
-        elif now < self.start_time:
-            actual_status = 'upcoming'
-        elif now >= self.start_time and now <= self.end_time:
-            actual_status = 'ongoing'
+        return Activity.to_dict_list([self])[0]
+    
+    @staticmethod
+    def to_dict_list(activities):
+        """
+        批量序列化活动列表
+        
+        子项目报名人数通过一次分组统计查询获取，组织者名称通过一次查询获取，
+        避免逐个活动、逐个子项目地查询数据库
+        
+        Args:
+            activities: Activity对象列表，或utils.projections查询出的同名字段行
+            
+        Returns:
+            list: 与to_dict格式相同的字典列表
+        """
+        if not activities:
+            return []
+        
+        # 一次查询获取所有组织者名称
+        organizer_ids = {activity.organizer_id for activity in activities}
+        organizer_names = dict(
+            db.session.query(User.id, User.username).filter(User.id.in_(organizer_ids)).all()
+        )
+        
+        # 一次查询读取所有子项目的报名人数计数器
+        sub_item_counts = {}
+        activity_ids = [activity.id for activity in activities if activity.sub_items]
+        if activity_ids:
+            rows = db.session.query(
+                ActivitySubItem.activity_id,
+                ActivitySubItem.name,
+                ActivitySubItem.current_participants
+            ).filter(ActivitySubItem.activity_id.in_(activity_ids)).all()
+            sub_item_counts = {(activity_id, name): count for activity_id, name, count in rows}
+        
+        return [
+            Activity._serialize(activity, organizer_names.get(activity.organizer_id), sub_item_counts)
+            for activity in activities
+        ]
+    
+    @staticmethod
+    def lifecycle_status(start_time, end_time, now=None):
+        """根据开始和结束时间计算活动所处阶段（不考虑取消状态）"""
+        now = now or datetime.utcnow()
+        # 请求中解析出的时间带有UTC时区信息，数据库中存储的是不带时区的UTC时间
+        if start_time.tzinfo:
+            start_time = start_time.astimezone(timezone.utc).replace(tzinfo=None)
+        if end_time.tzinfo:
+            end_time = end_time.astimezone(timezone.utc).replace(tzinfo=None)
+        if now < start_time:
+            return 'upcoming'
+        elif now >= start_time and now <= end_time:
+            return 'ongoing'
         else:
-            actual_status = 'completed'
-        
-        # 处理子项目，添加当前参与人数
-        sub_items = json.loads(self.sub_items) if self.sub_items else []
-        if sub_items:
-            # 统计每个子项目的报名人数
-            for item in sub_items:
-                if isinstance(item, dict) and 'name' in item:
-                    count = Registration.query.filter_by(
-                        activity_id=self.id,
-                        sub_item=item['name']
-                    ).filter(Registration.status != 'cancelled').count()
-                    item['currentParticipants'] = count
+            return 'completed'
+    
+    @staticmethod
+    def status_filter(status, now=None):
+        """
+        将活动状态筛选转换为开始/结束时间上的范围条件，可以直接使用时间索引
         
+        Args:
+            status: upcoming/ongoing/completed/cancelled
+            now: 当前UTC时间，默认为datetime.utcnow()
+            
+        Returns:
+            SQLAlchemy筛选条件
+        """
+        now = now or datetime.utcnow()
+        if status == 'cancelled':
+            return Activity.status == 'cancelled'
+        # 状态为空的旧数据按时间归入对应阶段（status != 'cancelled' 对NULL不成立）
+        not_cancelled = db.or_(Activity.status.is_(None), Activity.status != 'cancelled')
+        if status == 'upcoming':
+            return db.and_(not_cancelled, Activity.start_time > now)
+        elif status == 'ongoing':
+            return db.and_(not_cancelled, Activity.start_time <= now, Activity.end_time >= now)
+        elif status == 'completed':
+            return db.and_(not_cancelled, Activity.end_time < now)
+        return Activity.status == status
+    
+    @staticmethod
+    def resolve_status(status, start_time, end_time):
+        """根据存储的状态和时间动态计算活动状态"""
+        if status == 'cancelled':
+            return 'cancelled'
+        return Activity.lifecycle_status(start_time, end_time)
+    
+    def get_actual_status(self):
+        """根据时间动态计算活动状态"""
+        return Activity.resolve_status(self.status, self.start_time, self.end_time)
+    
+    @staticmethod
+    def summary_dict(activity):
+        """活动摘要（用于嵌入报名记录等列表），activity可以是实体或列投影行"""
         return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'category': self.category,
+            'id': activity.id,
+            'title': activity.title,
+            'category': activity.category,
+            'status': Activity.resolve_status(activity.status, activity.start_time, activity.end_time),
+            'startTime': activity.start_time.isoformat() + 'Z',
+            'endTime': activity.end_time.isoformat() + 'Z',
+            'location': activity.location,
+            'coverImage': activity.cover_image
+        }
+    
+    @staticmethod
+    def reserve_seat(activity_id, count=1, open_only=False):
+        """
+        原子地占用名额（不提交事务）
+        
+        名额判断和计数递增在同一条条件UPDATE中完成，并发报名时不会超员
+        
+        Args:
+            activity_id: 活动ID
+            count: 占用的名额数，剩余名额不足时一个也不占用
+            open_only: 为True时报名已截止或活动已取消则不占用（用于不经过报名接口检查的候补转正）
+        
+        Returns:
+            bool: 是否占用成功（活动不存在、名额不足或open_only时报名已关闭为False）
+        """
+        conditions = [Activity.id == activity_id, Activity.current_participants + count <= Activity.max_participants]
+        if open_only:
+            conditions += [
+                Activity.registration_deadline >= datetime.utcnow(),
+                db.or_(Activity.status.is_(None), Activity.status != 'cancelled')
+            ]
+        return Activity.query.filter(*conditions).update(
+            {'current_participants': Activity.current_participants + count},
+            synchronize_session=False
+        ) == 1
+    
+    @staticmethod
+    def release_seat(activity_id, count=1):
+        """原子地释放名额（不提交事务），计数不会小于0"""
+        Activity.query.filter(
+            Activity.id == activity_id,
+            Activity.current_participants >= count
+        ).update(
+            {'current_participants': Activity.current_participants - count},
+            synchronize_session=False
+        )
+    
+    def sub_item_names(self):
+        """返回活动的子项目名称列表"""
+        return [item['name'] for item in self.sub_items or [] if isinstance(item, dict) and 'name' in item]
+    
+    @staticmethod
+    def sub_item_limits(sub_items):
+        """
+        返回 {子项目名称: 人数上限}
+        
+        上限取子项目的maxParticipants（前端保存的字段），兼容旧的max，都未设置时为None（不限）
+        """
+        limits = {}
+        for item in sub_items or []:
+            if isinstance(item, dict) and 'name' in item:
+                limit = item.get('maxParticipants')
+                limits[item['name']] = limit if limit is not None else item.get('max')
+        return limits
+    
+    def sync_sub_item_counters(self):
+        """
+        根据sub_items同步子项目计数器行（创建或修改活动后调用，需在flush之后）
+        
+        新增的子项目按现有报名记录初始化计数，已删除的子项目移除计数器，
+        子项目的maxParticipants同步为计数器的人数上限
+        """
+        limits = Activity.sub_item_limits(self.sub_items)
+        names = list(limits)
+        
+        existing = {counter.name: counter for counter in
+                    ActivitySubItem.query.filter_by(activity_id=self.id).all()}
+        
+        for name, counter in existing.items():
+            if name not in names:
+                db.session.delete(counter)
+            elif counter.max_participants != limits[name]:
+                counter.max_participants = limits[name]
+        
+        new_names = [name for name in dict.fromkeys(names) if name not in existing]
+        if new_names:
+            counts = dict(db.session.query(
+                Registration.sub_item,
+                func.count(Registration.id)
+            ).filter(
+                Registration.activity_id == self.id,
+                Registration.sub_item.in_(new_names),
+                Registration.status != 'cancelled'
+            ).group_by(Registration.sub_item).all())
+            for name in new_names:
+                db.session.add(ActivitySubItem(
+                    activity_id=self.id,
+                    name=name,
+                    current_participants=counts.get(name, 0),
+                    max_participants=limits[name]
+                ))
+    
+    def sync_tags(self):
+        """根据tags同步activity_tags标签索引行（创建或修改活动后调用，需在flush之后）"""
+        tags = set(tag for tag in self.tags or [] if isinstance(tag, str))
+        existing = {row.tag: row for row in ActivityTag.query.filter_by(activity_id=self.id).all()}
+        
+        for tag, row in existing.items():
+            if tag not in tags:
+                db.session.delete(row)
+        for tag in tags - set(existing):
+            db.session.add(ActivityTag(activity_id=self.id, tag=tag))
+    
+    @staticmethod
+    def _serialize(activity, organizer_name, sub_item_counts):
+        actual_status = Activity.resolve_status(activity.status, activity.start_time, activity.end_time)
+        
+        # 处理子项目，添加当前参与人数（复制一份，避免修改实例上缓存的解析结果）
+        sub_items = []
+        for item in activity.sub_items or []:
+            if isinstance(item, dict) and 'name' in item:
+                item = dict(item, currentParticipants=sub_item_counts.get((activity.id, item['name']), 0))
+            sub_items.append(item)
+        
+        return {
+            'id': activity.id,
+            'title': activity.title,
+            'description': activity.description,
+            'category': activity.category,
             'status': actual_status,  # 使用动态计算的状态
-            'organizerId': self.organizer_id,
-            'organizerName': self.organizer.username,
-            'startTime': self.start_time.isoformat() + 'Z',
-            'endTime': self.end_time.isoformat() + 'Z',
-            'location': self.location,
-            'maxParticipants': self.max_participants,
-            'currentParticipants': self.current_participants,
-            'registrationDeadline': self.registration_deadline.isoformat() + 'Z',
-            'coverImage': self.cover_image,
-            'images': json.loads(self.images) if self.images else [],
-            'tags': json.loads(self.tags) if self.tags else [],
+            'organizerId': activity.organizer_id,
+            'organizerName': organizer_name,
+            'startTime': activity.start_time.isoformat() + 'Z',
+            'endTime': activity.end_time.isoformat() + 'Z',
+            'location': activity.location,
+            'maxParticipants': activity.max_participants,
+            'currentParticipants': activity.current_participants,
+            'registrationDeadline': activity.registration_deadline.isoformat() + 'Z',
+            'coverImage': activity.cover_image,
+            'images': list(activity.images or []),
+            'tags': list(activity.tags or []),
             'subItems': sub_items,
-            'createdAt': self.created_at.isoformat() + 'Z',
-            'updatedAt': self.updated_at.isoformat() + 'Z'
+            'admissionMode': activity.admission_mode,
+            'createdAt': activity.created_at.isoformat() + 'Z',
+            'updatedAt': activity.updated_at.isoformat() + 'Z'
         }
 
 
+class ActivitySubItem(db.Model):
+    """子项目报名人数计数器，报名和取消报名时在同一事务中维护"""
+    __tablename__ = 'activity_sub_items'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    current_participants = db.Column(db.Integer, default=0, nullable=False)
+    max_participants = db.Column(db.Integer)  # 子项目人数上限，为空时不限
+    
+    __table_args__ = (db.UniqueConstraint('activity_id', 'name', name='unique_activity_sub_item'),)
+    
+    @staticmethod
+    def reserve(activity_id, name, count=1):
+        """
+        原子地占用子项目名额（不提交事务），与Activity.reserve_seat语义相同
+        
+        Args:
+            activity_id: 活动ID
+            name: 子项目名称，为空时不做限制
+            count: 占用的名额数，剩余名额不足时一个也不占用
+        
+        Returns:
+            bool: 是否占用成功（子项目不存在或名额不足时为False）
+        """
+        if not name:
+            return True
+        updated = ActivitySubItem.query.filter(
+            ActivitySubItem.activity_id == activity_id,
+            ActivitySubItem.name == name,
+            db.or_(
+                ActivitySubItem.max_participants.is_(None),
+                ActivitySubItem.current_participants + count <= ActivitySubItem.max_participants
+            )
+        ).update(
+            {'current_participants': ActivitySubItem.current_participants + count},
+            synchronize_session=False
+        )
+        if updated:
+            ActivitySubItem.bump_version([activity_id])
+        return updated == 1
+    
+    @staticmethod
+    def adjust(activity_id, name, delta):
+        """
+        原子地调整子项目计数（不提交事务）
+        
+        Args:
+            activity_id: 活动ID
+            name: 子项目名称，为空时忽略
+            delta: 增量，减少时计数不会小于0
+        """
+        if not name:
+            return
+        query = ActivitySubItem.query.filter_by(activity_id=activity_id, name=name)
+        if delta < 0:
+            query = query.filter(ActivitySubItem.current_participants >= -delta)
+        updated = query.update(
+            {'current_participants': ActivitySubItem.current_participants + delta},
+            synchronize_session=False
+        )
+        if updated:
+            ActivitySubItem.bump_version([activity_id])
+    
+    @staticmethod
+    def bump_version(activity_ids):
+        """递增活动的子项目计数器版本号（不提交事务），用于生成ETag"""
+        if not activity_ids:
+            return
+        Activity.query.filter(Activity.id.in_(activity_ids)).update(
+            {'counters_version': Activity.counters_version + 1},
+            synchronize_session=False
+        )
+
+
+class ActivityTag(db.Model):
+    """活动标签索引，创建和修改活动时与tags同步，用于按标签筛选"""
+    __tablename__ = 'activity_tags'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    tag = db.Column(db.String(50), nullable=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('activity_id', 'tag', name='unique_activity_tag'),
+        db.Index('ix_activity_tags_tag', 'tag', 'activity_id'),
+    )
+
+
 class Registration(db.Model):
     __tablename__ = 'registrations'
     
@@ -129,35 +459,310 @@ class Registration(db.Model):
     registered_at = db.Column(db.DateTime, default=datetime.utcnow)
     checked_in_at = db.Column(db.DateTime)
     
-    # 唯一约束：一个用户只能报名一个活动一次
-    __table_args__ = (db.UniqueConstraint('activity_id', 'user_id', name='unique_activity_user'),)
+    __table_args__ = (
+        # 唯一约束：一个用户只能报名一个活动一次
+        db.UniqueConstraint('activity_id', 'user_id', name='unique_activity_user'),
+        db.Index('ix_registrations_activity_status', 'activity_id', 'status'),
+        db.Index('ix_registrations_user_status_registered', 'user_id', 'status', 'registered_at'),
+        db.Index('ix_registrations_user_registered', 'user_id', 'registered_at'),
+    )
     
-    def to_dict(self):
-        # 获取活动信息
-        activity = Activity.query.get(self.activity_id)
+    # admit返回的失败原因
+    ERROR_FULL = '活动名额已满'
+    ERROR_SUB_ITEM_FULL = '该子项目名额已满'
+    ERROR_DUPLICATE = '已经报名过该活动'
+    # 名额不足导致的失败，可以加入候补名单
+    CAPACITY_ERRORS = (ERROR_FULL, ERROR_SUB_ITEM_FULL)
+    
+    @staticmethod
+    def activate(activity_id, user_id, sub_item):
+        """
+        写入有效的报名记录（不提交事务）
+        
+        使用 INSERT ... ON CONFLICT DO UPDATE：没有记录时新建，已取消的记录重新启用，
+        已有有效报名时不做修改
         
-        # 对于学生用户，从Credential表获取真实姓名和学号
-        user_name = self.user.username
-        user_email = self.user.email
+        Returns:
+            bool: 是否写入成功（已有有效报名时为False）
+        """
+        now = datetime.utcnow()
+        stmt = sqlite_insert(Registration).values(
+            activity_id=activity_id,
+            user_id=user_id,
+            status='registered',
+            sub_item=sub_item,
+            registered_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['activity_id', 'user_id'],
+            set_={'status': 'registered', 'sub_item': sub_item, 'registered_at': now},
+            where=Registration.status == 'cancelled'
+        )
+        return db.session.execute(stmt).rowcount == 1
+    
+    @staticmethod
+    def admit(activity_id, user_id, sub_item):
+        """
+        占用名额并写入有效的报名记录（不提交事务）
         
-        if self.user.role == 'student':
-            credential = Credential.query.filter_by(account_id=self.user.username).first()
-            if credential:
-                user_name = credential.name if credential.name else self.user.username
-                user_email = credential.account_id  # 显示学号而不是邮箱
+        依次占用活动名额和子项目名额，之后的步骤失败时释放已占用的名额，失败时不会留下任何变更，
+        因此排队模式下多个报名可以在同一个事务中批量提交
         
-        return {
-            'id': self.id,
-            'activityId': self.activity_id,
-            'userId': self.user_id,
-            'userName': user_name,
-            'userEmail': user_email,
-            'status': self.status,
-            'subItem': self.sub_item,
-            'registeredAt': self.registered_at.isoformat() + 'Z',
-            'checkedInAt': self.checked_in_at.isoformat() + 'Z' if self.checked_in_at else None,
-            'activity': activity.to_dict() if activity else None
-        }
+        Returns:
+            str: 失败原因，成功时为None
+        """
+        if not Activity.reserve_seat(activity_id):
+            return Registration.ERROR_FULL
+        if not ActivitySubItem.reserve(activity_id, sub_item):
+            Activity.release_seat(activity_id)
+            return Registration.ERROR_SUB_ITEM_FULL
+        if not Registration.activate(activity_id, user_id, sub_item):
+            Activity.release_seat(activity_id)
+            ActivitySubItem.adjust(activity_id, sub_item, -1)
+            return Registration.ERROR_DUPLICATE
+        WaitlistEntry.leave(activity_id, user_id)
+        return None
+    
+    @staticmethod
+    def schedule_conflicts(user_id, activity, limit=5):
+        """
+        查找学生的有效报名中与活动时间重叠的其他活动（已取消的活动除外）
+        
+        从学生的报名索引出发，按主键连接活动并比较开始/结束时间，
+        耗时只与该学生的报名数有关，与活动总数无关
+        
+        Args:
+            user_id: 学生ID
+            activity: 要报名的活动
+            limit: 最多返回的冲突活动数
+            
+        Returns:
+            list: 冲突活动的 (id, title, start_time, end_time) 行
+        """
+        return db.session.execute(SCHEDULE_CONFLICTS_QUERY, {
+            'user_id': user_id,
+            'activity_id': activity.id,
+            'start_time': activity.start_time,
+            'end_time': activity.end_time,
+            'limit': limit
+        }).all()
+    
+    def to_dict(self, activity_summary=False):
+        return Registration.to_dict_list([self], activity_summary=activity_summary)[0]
+    
+    @staticmethod
+    def to_dict_list(registrations, activity_summary=False):
+        """
+        批量序列化报名记录
+        
+        用户和活动各用一次查询批量加载，学生姓名通过带缓存的批量解析获取，
+        查询次数与记录条数无关
+        
+        Args:
+            registrations: Registration对象列表，或utils.projections查询出的同名字段行
+            activity_summary: 为True时嵌入活动摘要，否则嵌入完整活动信息
+            
+        Returns:
+            list: 报名记录字典列表
+        """
+        if not registrations:
+            return []
+        
+        from utils.student_names import resolve_user_identities
+        from utils.projections import load_user_identities, load_activities
+        
+        identities = resolve_user_identities(load_user_identities({reg.user_id for reg in registrations}))
+        
+        activities = load_activities({reg.activity_id for reg in registrations}, summary=activity_summary)
+        if activity_summary:
+            activity_dicts = {activity.id: Activity.summary_dict(activity) for activity in activities}
+        else:
+            activity_dicts = {item['id']: item for item in Activity.to_dict_list(activities)}
+        
+        result = []
+        for reg in registrations:
+            user_name, user_email = identities.get(reg.user_id, ('Unknown', ''))
+            result.append({
+                'id': reg.id,
+                'activityId': reg.activity_id,
+                'userId': reg.user_id,
+                'userName': user_name,
+                'userEmail': user_email,
+                'status': reg.status,
+                'subItem': reg.sub_item,
+                'registeredAt': reg.registered_at.isoformat() + 'Z',
+                'checkedInAt': reg.checked_in_at.isoformat() + 'Z' if reg.checked_in_at else None,
+                'activity': activity_dicts.get(reg.activity_id)
+            })
+        return result
+    
+    @staticmethod
+    def to_slim_dict_list(registrations):
+        """
+        序列化当前用户自己的报名记录：不含用户信息，只嵌入活动摘要，活动一次查询加载
+        
+        Args:
+            registrations: Registration对象列表，或utils.projections查询出的同名字段行
+            
+        Returns:
+            list: 报名记录字典列表
+        """
+        if not registrations:
+            return []
+        
+        from utils.projections import load_activities
+        
+        activities = {activity.id: Activity.summary_dict(activity) for activity in
+                      load_activities({reg.activity_id for reg in registrations}, summary=True)}
+        return [{
+            'id': reg.id,
+            'activityId': reg.activity_id,
+            'status': reg.status,
+            'subItem': reg.sub_item,
+            'registeredAt': reg.registered_at.isoformat() + 'Z',
+            'checkedInAt': reg.checked_in_at.isoformat() + 'Z' if reg.checked_in_at else None,
+            'activity': activities.get(reg.activity_id)
+        } for reg in registrations]
+
+
+# 报名时的时间冲突查询，预先构建语句，每次报名只绑定参数，省去构建语句的开销
+SCHEDULE_CONFLICTS_QUERY = select(
+    Activity.id, Activity.title, Activity.start_time, Activity.end_time
+).join(
+    Registration, Registration.activity_id == Activity.id
+).where(
+    Registration.user_id == bindparam('user_id'),
+    Registration.status != 'cancelled',
+    Activity.id != bindparam('activity_id'),
+    Activity.start_time < bindparam('end_time'),
+    Activity.end_time > bindparam('start_time'),
+    db.or_(Activity.status.is_(None), Activity.status != 'cancelled')
+).order_by(Activity.start_time).limit(bindparam('limit'))
+
+
+class WaitlistEntry(db.Model):
+    """
+    候补名单，活动名额已满时按加入顺序排队
+    
+    position在同一活动内单调递增，(activity_id, position) 上的唯一索引使取队首和分配新位置
+    都是一次索引查找，与候补人数无关
+    """
+    __tablename__ = 'waitlist_entries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    sub_item = db.Column(db.String(100))
+    position = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('activity_id', 'user_id', name='unique_waitlist_activity_user'),
+        db.UniqueConstraint('activity_id', 'position', name='unique_waitlist_activity_position'),
+        db.Index('ix_waitlist_activity_sub_item_position', 'activity_id', 'sub_item', 'position'),
+    )
+    
+    @staticmethod
+    def join(activity_id, user_id, sub_item):
+        """
+        加入候补名单队尾（不提交事务）
+        
+        新位置在同一条INSERT语句中按当前最大位置加1分配，并发加入时不会重复
+        
+        Returns:
+            bool: 是否加入成功（已在候补名单中时为False）
+        """
+        next_position = db.select(func.coalesce(func.max(WaitlistEntry.position), 0) + 1).where(
+            WaitlistEntry.activity_id == activity_id
+        ).scalar_subquery()
+        stmt = sqlite_insert(WaitlistEntry).values(
+            activity_id=activity_id,
+            user_id=user_id,
+            sub_item=sub_item,
+            position=next_position,
+            created_at=datetime.utcnow()
+        ).on_conflict_do_nothing(index_elements=['activity_id', 'user_id'])
+        return db.session.execute(stmt).rowcount == 1
+    
+    @staticmethod
+    def leave(activity_id, user_id):
+        """退出候补名单（不提交事务），返回是否在候补名单中"""
+        return WaitlistEntry.query.filter_by(activity_id=activity_id, user_id=user_id).delete(
+            synchronize_session=False
+        ) > 0
+    
+    @staticmethod
+    def promote_next(activity_id, sub_item=None):
+        """
+        为候补名单中排在最前、且所选子项目仍有名额的学生占用名额并写入报名记录（不提交事务）
+        
+        在释放名额的同一事务中调用，报名已截止或活动已取消时不转正。传入释放名额的子项目时，
+        先按 (activity_id, sub_item, position) 索引取该子项目的候补队首，其子项目名额刚刚空出；
+        该子项目没有候补或名额已被占用时，按 (activity_id, position) 顺序取第一个不选子项目
+        或所选子项目仍有名额的条目，子项目已满的条目在同一条查询中跳过。
+        队首已经通过其他方式报名时移除该条目并取下一个
+        
+        Args:
+            activity_id: 活动ID
+            sub_item: 刚释放名额的子项目
+        
+        Returns:
+            WaitlistEntry: 被转为正式报名的条目，没有可用名额或没有合适的候补时为None
+        """
+        if not Activity.reserve_seat(activity_id, open_only=True):
+            return None
+        # 子项目名额未能占用的条目，本次不再考虑
+        skipped = []
+        while True:
+            head = None
+            if sub_item:
+                head = WaitlistEntry.query.filter_by(activity_id=activity_id, sub_item=sub_item).order_by(
+                    WaitlistEntry.position
+                ).first()
+            if head is None:
+                head = WaitlistEntry.query.outerjoin(ActivitySubItem, db.and_(
+                    ActivitySubItem.activity_id == WaitlistEntry.activity_id,
+                    ActivitySubItem.name == WaitlistEntry.sub_item
+                )).filter(
+                    WaitlistEntry.activity_id == activity_id,
+                    WaitlistEntry.id.notin_(skipped),
+                    db.or_(
+                        WaitlistEntry.sub_item.is_(None),
+                        ActivitySubItem.max_participants.is_(None) & ActivitySubItem.id.isnot(None),
+                        ActivitySubItem.current_participants < ActivitySubItem.max_participants
+                    )
+                ).order_by(WaitlistEntry.position).first()
+            if head is None:
+                Activity.release_seat(activity_id)
+                return None
+            if not ActivitySubItem.reserve(activity_id, head.sub_item):
+                # 释放的子项目名额已被占用时，改为在整个候补名单中查找
+                skipped.append(head.id)
+                sub_item = None
+                continue
+            db.session.delete(head)
+            if Registration.activate(activity_id, head.user_id, head.sub_item):
+                return head
+            ActivitySubItem.adjust(activity_id, head.sub_item, -1)
+    
+    @staticmethod
+    def position_of(activity_id, user_id):
+        """
+        返回学生在候补名单中的排位（从1开始）和子项目，不在候补名单中时返回None
+        
+        排位按存储的position与队首position之差计算，两次索引查找，与候补人数无关。
+        队伍中间有人退出或被跳过转正时，排位是上限，实际可能更靠前
+        """
+        head = db.select(func.min(WaitlistEntry.position)).where(
+            WaitlistEntry.activity_id == activity_id
+        ).scalar_subquery()
+        row = db.session.query(WaitlistEntry.position - head + 1, WaitlistEntry.sub_item).filter(
+            WaitlistEntry.activity_id == activity_id,
+            WaitlistEntry.user_id == user_id
+        ).first()
+        if row is None:
+            return None
+        return {'position': row[0], 'subItem': row[1]}
 
 
 class CheckIn(db.Model):
@@ -169,30 +774,114 @@ class CheckIn(db.Model):
     method = db.Column(db.String(20), nullable=False)  # qrcode, code
     checked_in_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_checkins_activity_user', 'activity_id', 'user_id'),
+        db.Index('ix_checkins_user_checked_in', 'user_id', 'checked_in_at'),
+    )
+    
+    @staticmethod
+    def record(activity_id, user_id, password_version, method):
+        """
+        签到快速路径（不提交事务）：一条条件UPDATE完成全部校验并更新报名状态，一条INSERT写入签到记录
+        
+        UPDATE的条件同时校验用户已启用、未删除且密码版本与token一致，以及报名状态为registered，
+        并发的重复签到只有一个能更新成功。签到码或二维码由调用方事先校验
+        
+        Args:
+            activity_id: 活动ID
+            user_id: 学生ID
+            password_version: token中的密码版本
+            method: 签到方式（qrcode/code）
+            
+        Returns:
+            tuple: (签到记录ID, 签到时间)，校验不通过时为None
+        """
+        now = datetime.utcnow()
+        updated = db.session.execute(
+            CHECKIN_UPDATE,
+            {'b_activity_id': activity_id, 'b_user_id': user_id, 'b_password_version': password_version,
+             'b_now': now},
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        if not updated:
+            return None
+        result = db.session.execute(insert(CheckIn.__table__), {
+            'activity_id': activity_id, 'user_id': user_id, 'method': method, 'checked_in_at': now
+        })
+        return result.inserted_primary_key[0], now
+    
+    @staticmethod
+    def record_many(entries):
+        """
+        批量签到（不提交事务）：一条条件UPDATE校验并更新整批报名状态，一条INSERT写入通过校验的签到记录
+        
+        校验条件与record相同，同一批中重复的签到只处理第一条
+        
+        Args:
+            entries: [(活动ID, 学生ID, token中的密码版本, 签到方式)]
+            
+        Returns:
+            list: 与entries一一对应的 (签到记录ID, 签到时间)，校验不通过的为None
+        """
+        now = datetime.utcnow()
+        first = {}
+        for index, (activity_id, user_id, password_version, _) in enumerate(entries):
+            first.setdefault((activity_id, user_id, password_version), index)
+        
+        updated = db.session.execute(CHECKIN_BATCH_UPDATE, {'b_keys': json.dumps(list(first)), 'b_now': now}).all()
+        accepted = [first[tuple(row)] for row in updated]
+        
+        results = [None] * len(entries)
+        if not accepted:
+            return results
+        
+        # 通过校验的 (活动ID, 学生ID) 在批次中不重复，按其对应插入的签到记录ID
+        table = CheckIn.__table__
+        inserted = db.session.execute(
+            insert(table).returning(table.c.id, table.c.activity_id, table.c.user_id),
+            [{'activity_id': entries[index][0], 'user_id': entries[index][1], 'method': entries[index][3],
+              'checked_in_at': now} for index in accepted]
+        ).all()
+        checkin_ids = {(activity_id, user_id): checkin_id for checkin_id, activity_id, user_id in inserted}
+        for index in accepted:
+            results[index] = (checkin_ids[entries[index][0], entries[index][1]], now)
+        return results
+    
     def to_dict(self):
-        # 获取用户信息
-        from models import User
-        user = User.query.get(self.user_id)
+        return CheckIn.to_dict_list([self])[0]
+    
+    @staticmethod
+    def to_dict_list(checkins):
+        """
+        批量序列化签到记录，用户一次查询加载，学生姓名通过带缓存的批量解析获取
         
-        user_name = user.username if user else 'Unknown'
-        user_email = user.email if user else ''
+        Args:
+            checkins: CheckIn对象列表，或utils.projections查询出的同名字段行
+            
+        Returns:
+            list: 签到记录字典列表
+        """
+        from utils.student_names import resolve_user_identities
+        from utils.projections import load_user_identities
         
-        # 对于学生用户，从Credential表获取真实姓名和学号
-        if user and user.role == 'student':
-            credential = Credential.query.filter_by(account_id=user.username).first()
-            if credential:
-                user_name = credential.name if credential.name else user.username
-                user_email = credential.account_id  # 显示学号而不是邮箱
+        if not checkins:
+            return []
         
-        return {
-            'id': self.id,
-            'activityId': self.activity_id,
-            'userId': self.user_id,
-            'userName': user_name,
-            'userEmail': user_email,
-            'method': self.method,
-            'checkedInAt': self.checked_in_at.isoformat() + 'Z'
-        }
+        identities = resolve_user_identities(load_user_identities({checkin.user_id for checkin in checkins}))
+        
+        result = []
+        for checkin in checkins:
+            user_name, user_email = identities.get(checkin.user_id, ('Unknown', ''))
+            result.append({
+                'id': checkin.id,
+                'activityId': checkin.activity_id,
+                'userId': checkin.user_id,
+                'userName': user_name,
+                'userEmail': user_email,
+                'method': checkin.method,
+                'checkedInAt': checkin.checked_in_at.isoformat() + 'Z'
+            })
+        return result
 
 
 class CheckInCode(db.Model):
@@ -204,6 +893,11 @@ class CheckInCode(db.Model):
     expires_at = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_checkin_codes_activity_code_expires', 'activity_id', 'code', 'expires_at'),
+        db.Index('ix_checkin_codes_expires', 'expires_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -214,6 +908,46 @@ class CheckInCode(db.Model):
         }
 
 
+# 签到快速路径的条件UPDATE，预先构建，每次签到只绑定参数
+CHECKIN_UPDATE = update(Registration).where(
+    Registration.activity_id == bindparam('b_activity_id'),
+    Registration.user_id == bindparam('b_user_id'),
+    Registration.status == 'registered',
+    select(User.id).where(
+        User.id == bindparam('b_user_id'),
+        User.is_active == True,
+        User.is_deleted == False,
+        User.password_version == bindparam('b_password_version')
+    ).exists()
+).values(status='checked_in', checked_in_at=bindparam('b_now'))
+
+# 批量签到的条件UPDATE：b_keys为 [[活动ID, 学生ID, token中的密码版本], ...] 的JSON，
+# 用json_each展开后按 (activity_id, user_id) 索引逐条定位报名记录，一条语句校验并更新整批，
+# 返回更新成功的 (活动ID, 学生ID, 密码版本)
+_batch_keys = func.json_each(bindparam('b_keys')).table_valued('value').alias('batch_keys')
+_batch_registration = Registration.__table__.alias('batch_registration')
+_registrations = Registration.__table__
+CHECKIN_BATCH_UPDATE = update(_registrations).where(
+    _registrations.c.id.in_(
+        select(_batch_registration.c.id).select_from(_batch_keys).join(
+            _batch_registration,
+            (_batch_registration.c.activity_id == func.json_extract(_batch_keys.c.value, '$[0]')) &
+            (_batch_registration.c.user_id == func.json_extract(_batch_keys.c.value, '$[1]'))
+        ).join(
+            User,
+            (User.id == _batch_registration.c.user_id) &
+            (User.password_version == func.json_extract(_batch_keys.c.value, '$[2]')) &
+            (User.is_active == True) &
+            (User.is_deleted == False)
+        ).where(_batch_registration.c.status == 'registered')
+    )
+).values(status='checked_in', checked_in_at=bindparam('b_now')).returning(
+    _registrations.c.activity_id,
+    _registrations.c.user_id,
+    select(User.password_version).where(User.id == _registrations.c.user_id).scalar_subquery()
+)
+
+
 class Credential(db.Model):
     __tablename__ = 'credentials'
     
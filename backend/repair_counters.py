@@ -0,0 +1,29 @@
+"""
+计数器修复脚本：根据报名记录修正活动参与人数，并重建子项目报名人数计数器
+
+首次部署子项目计数器或手动修改过报名数据后运行。活动参与人数的修正可以在服务运行时执行，
+服务进程中也会按 COUNTER_RECONCILE_INTERVAL 定时执行
+"""
+from app import create_app
+from models import db
+from utils.counters import rebuild_sub_item_counters, reconcile_participant_counters
+
+
+def repair():
+    app = create_app()
+    
+    with app.app_context():
+        # 确保计数器表存在
+        db.create_all()
+        
+        result = reconcile_participant_counters()
+        print(f"✓ 活动参与人数检查完成: 检查 {result['checked']} 个活动, "
+              f"有偏差 {result['drifted']} 个, 修正 {result['updated']} 个")
+        
+        result = rebuild_sub_item_counters()
+        print(f"✓ 子项目计数器重建完成: 新建 {result['created']} 个, "
+              f"修正 {result['updated']} 个, 删除 {result['deleted']} 个")
+
+
+if __name__ == '__main__':
+    repair()
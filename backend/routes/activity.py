@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Activity, User, Registration
+from models import db, Activity, User, Registration, ActivityTag, ActivitySubItem, WaitlistEntry
 from datetime import datetime
-import json
 from utils.auth_helper import parse_user_id, require_active_user
+from utils.projections import select_activities, paginate_rows
+from utils.etag import activity_etag, not_modified, with_etag
+from utils import response_cache
 
 activity_bp = Blueprint('activity', __name__)
 
@@ -15,54 +17,110 @@ def get_activities():
     category = request.args.get('category')
     status = request.args.get('status')
     keyword = request.args.get('keyword')
+    tag = request.args.get('tag')
     start_date = request.args.get('startDate')
     
-    query = Activity.query
+    cache_key = response_cache.list_key(page=page, page_size=page_size, category=category, status=status,
+                                        keyword=keyword, tag=tag, start_date=start_date)
+    cached, generation = response_cache.lookup(cache_key)
+    if cached:
+        return cached
+    
+    query = select_activities()
     
     # 筛选条件
     if category:
-        query = query.filter_by(category=category)
+        query = query.where(Activity.category == category)
     if status:
-        query = query.filter_by(status=status)
+        query = query.where(Activity.status_filter(status))
     if keyword:
-        query = query.filter(Activity.title.contains(keyword))
+        query = query.where(Activity.title.contains(keyword))
+    if tag:
+        query = query.where(Activity.id.in_(
+            db.select(ActivityTag.activity_id).where(ActivityTag.tag == tag)
+        ))
     if start_date:
         # 匹配当天开始的活动（从00:00:00到23:59:59）
         start_datetime = datetime.fromisoformat(start_date)
         end_datetime = start_datetime.replace(hour=23, minute=59, second=59, microsecond=999999)
-        query = query.filter(Activity.start_time >= start_datetime, Activity.start_time <= end_datetime)
+        query = query.where(Activity.start_time >= start_datetime, Activity.start_time <= end_datetime)
     
     # 分页
-    pagination = query.order_by(Activity.created_at.desc()).paginate(
-        page=page, per_page=page_size, error_out=False, max_per_page=100
-    )
+    pagination = paginate_rows(query.order_by(Activity.created_at.desc()), page, page_size)
     
-    return jsonify({
+    # 客户端缓存仍然有效时不再序列化
+    etag = activity_etag(pagination.items, pagination.total)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    response = with_etag(jsonify({
         'code': 200,
         'message': '获取成功',
         'data': {
-            'items': [activity.to_dict() for activity in pagination.items],
+            'items': Activity.to_dict_list(pagination.items),
             'total': pagination.total,
             'page': page,
             'pageSize': page_size,
             'totalPages': pagination.pages
         }
-    })
+    }), etag)
+    # 按状态筛选时，任一活动切换状态都可能改变结果
+    expires_at = response_cache.next_global_status_change() if status else None
+    response_cache.store(cache_key, generation, response, etag, pagination.items, expires_at)
+    return response
 
 
 @activity_bp.route('/<int:activity_id>', methods=['GET'])
 def get_activity(activity_id):
     """获取活动详情"""
-    activity = Activity.query.get(activity_id)
+    cache_key = response_cache.detail_key(activity_id)
+    cached, generation = response_cache.lookup(cache_key)
+    if cached:
+        return cached
+    
+    activity = db.session.execute(select_activities().where(Activity.id == activity_id)).first()
     
     if not activity:
         return jsonify({'code': 404, 'message': '活动不存在'}), 404
     
-    return jsonify({
+    # 客户端缓存仍然有效时不再序列化
+    etag = activity_etag([activity])
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    response = with_etag(jsonify({
         'code': 200,
         'message': '获取成功',
-        'data': activity.to_dict()
-    })
+        'data': Activity.to_dict_list([activity])[0]
+    }), etag)
+    response_cache.store(cache_key, generation, response, etag, [activity])
+    return response
+
+
+def _validate_sub_items(sub_items, activity_id=None):
+    """
+    校验子项目的人数上限maxParticipants（可选，正整数，兼容旧的max）
+    
+    Args:
+        sub_items: 请求中的subItems
+        activity_id: 修改活动时传入，上限不能少于该子项目已报名人数
+    
+    Returns:
+        str: 错误信息，校验通过时为None
+    """
+    limits = {name: limit for name, limit in Activity.sub_item_limits(sub_items).items() if limit is not None}
+    for limit in limits.values():
+        if isinstance(limit, bool) or not isinstance(limit, int) or limit <= 0:
+            return '子项目人数限制必须为正整数'
+    if activity_id and limits:
+        counts = dict(db.session.query(ActivitySubItem.name, ActivitySubItem.current_participants).filter(
+            ActivitySubItem.activity_id == activity_id, ActivitySubItem.name.in_(list(limits))
+        ).all())
+        if any(limit < counts.get(name, 0) for name, limit in limits.items()):
+            return '子项目人数限制不能少于已报名人数'
+    return None
 
 
 @activity_bp.route('', methods=['POST'])
@@ -89,6 +147,14 @@ def create_activity():
         if field not in data:
             return jsonify({'code': 400, 'message': f'缺少必填字段: {field}'}), 400
     
+    admission_mode = data.get('admissionMode', 'direct')
+    if admission_mode not in Activity.ADMISSION_MODES:
+        return jsonify({'code': 400, 'message': '无效的报名方式'}), 400
+    
+    error = _validate_sub_items(data.get('subItems', []))
+    if error:
+        return jsonify({'code': 400, 'message': error}), 400
+    
     # 处理图片数据
     images = data.get('images', [])
     cover_image = images[0] if images else None
@@ -105,13 +171,19 @@ def create_activity():
         max_participants=data['maxParticipants'],
         registration_deadline=datetime.fromisoformat(data['registrationDeadline'].replace('Z', '+00:00')),
         cover_image=cover_image,
-        images=json.dumps(images),
-        tags=json.dumps(data.get('tags', [])),
-        sub_items=json.dumps(data.get('subItems', []))
+        images=images,
+        tags=data.get('tags', []),
+        sub_items=data.get('subItems', []),
+        admission_mode=admission_mode
     )
+    activity.status = Activity.lifecycle_status(activity.start_time, activity.end_time)
     
     db.session.add(activity)
+    db.session.flush()
+    activity.sync_sub_item_counters()
+    activity.sync_tags()
     db.session.commit()
+    response_cache.invalidate_activity(activity.id, lists=True)
     
     return jsonify({
         'code': 200,
@@ -169,15 +241,33 @@ def update_activity(activity_id):
         activity.registration_deadline = datetime.fromisoformat(data['registrationDeadline'].replace('Z', '+00:00'))
     if 'images' in data:
         images = data['images']
-        activity.images = json.dumps(images)
+        activity.images = images
         activity.cover_image = images[0] if images else None
     if 'tags' in data:
-        activity.tags = json.dumps(data['tags'])
+        activity.tags = data['tags']
+        activity.sync_tags()
     if 'subItems' in data:
-        activity.sub_items = json.dumps(data['subItems'])
-    
+        error = _validate_sub_items(data['subItems'], activity_id)
+        if error:
+            return jsonify({'code': 400, 'message': error}), 400
+        activity.sub_items = data['subItems']
+        activity.sync_sub_item_counters()
+    if 'admissionMode' in data:
+        if data['admissionMode'] not in Activity.ADMISSION_MODES:
+            return jsonify({'code': 400, 'message': '无效的报名方式'}), 400
+        activity.admission_mode = data['admissionMode']
+    
+    # 扩容后新增的名额（包括子项目名额）按顺序转给候补名单
+    if 'maxParticipants' in data or 'subItems' in data:
+        db.session.flush()
+        while WaitlistEntry.promote_next(activity_id):
+            pass
+    
+    if activity.status != 'cancelled':
+        activity.status = Activity.lifecycle_status(activity.start_time, activity.end_time)
     activity.updated_at = datetime.utcnow()
     db.session.commit()
+    response_cache.invalidate_activity(activity_id, lists=True)
     
     return jsonify({
         'code': 200,
@@ -212,6 +302,7 @@ def delete_activity(activity_id):
     
     db.session.delete(activity)
     db.session.commit()
+    response_cache.invalidate_activity(activity_id, lists=True)
     
     return jsonify({
         'code': 200,
@@ -237,15 +328,16 @@ def get_my_activities():
     page = request.args.get('page', 1, type=int)
     page_size = request.args.get('pageSize', 10, type=int)
     
-    pagination = Activity.query.filter_by(organizer_id=user_id).order_by(
-        Activity.created_at.desc()
-    ).paginate(page=page, per_page=page_size, error_out=False, max_per_page=100)
+    pagination = paginate_rows(
+        select_activities().where(Activity.organizer_id == user_id).order_by(Activity.created_at.desc()),
+        page, page_size
+    )
     
     return jsonify({
         'code': 200,
         'message': '获取成功',
         'data': {
-            'items': [activity.to_dict() for activity in pagination.items],
+            'items': Activity.to_dict_list(pagination.items),
             'total': pagination.total,
             'page': page,
             'pageSize': page_size,
@@ -287,6 +379,7 @@ def admin_delete_activity(activity_id):
     
     db.session.delete(activity)
     db.session.commit()
+    response_cache.invalidate_activity(activity_id, lists=True)
     
     return jsonify({
         'code': 200,
@@ -294,6 +387,23 @@ def admin_delete_activity(activity_id):
     })
 
 
+@activity_bp.route('/admin/cache-stats', methods=['GET'])
+@jwt_required()
+def admin_cache_stats():
+    """管理员查看活动目录响应缓存的命中统计"""
+    identity = get_jwt_identity()
+    
+    # 验证是否为管理员
+    if not identity or not identity.startswith('admin_'):
+        return jsonify({'code': 403, 'message': '权限不足，仅管理员可访问'}), 403
+    
+    return jsonify({
+        'code': 200,
+        'message': '获取成功',
+        'data': response_cache.get_stats()
+    })
+
+
 @activity_bp.route('/admin/export', methods=['GET'])
 @jwt_required()
 def admin_export_activities():
@@ -310,7 +420,7 @@ def admin_export_activities():
         return jsonify({'code': 403, 'message': '权限不足，仅管理员可访问'}), 403
     
     # 获取所有活动
-    activities = Activity.query.order_by(Activity.created_at.desc()).all()
+    activities = Activity.query.options(db.joinedload(Activity.organizer)).order_by(Activity.created_at.desc()).all()
     
     # 创建Excel工作簿
     wb = Workbook()
@@ -344,24 +454,21 @@ def admin_export_activities():
         'other': '其他'
     }
     
+    # 状态映射
+    status_map = {
+        'upcoming': '未开始',
+        'ongoing': '进行中',
+        'completed': '已结束',
+        'cancelled': '已取消'
+    }
+    
     # 写入数据
     for activity in activities:
-        # 计算实际状态
-        now = datetime.utcnow()
-        if activity.status == 'cancelled':
-            actual_status = '已取消'
-        elif now < activity.start_time:
-            actual_status = '未开始'
-        elif now >= activity.start_time and now <= activity.end_time:
-            actual_status = '进行中'
-        else:
-            actual_status = '已结束'
-        
         row = [
             activity.id,
             activity.title,
             category_map.get(activity.category, activity.category),
-            actual_status,
+            status_map[activity.get_actual_status()],
             activity.organizer.username,
             activity.start_time.strftime('%Y-%m-%d %H:%M:%S'),
             activity.end_time.strftime('%Y-%m-%d %H:%M:%S'),
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from models import db, User, Credential
 import requests
+from utils.student_names import invalidate_student_name
 from utils.auth_helper import (
     parse_user_id, 
     parse_password_version, 
@@ -412,6 +413,7 @@ def login():
                 db.session.add(credential)
             
             db.session.commit()
+            invalidate_student_name(account_id)
             
             # 查找或创建对应的User记录（学生）
             student = User.query.filter_by(username=account_id, role='student').first()
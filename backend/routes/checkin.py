@@ -1,97 +1,154 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, CheckIn, Registration, Activity, User, CheckInCode
-from datetime import datetime, timedelta
-import random
-import string
-import json
-from utils.auth_helper import parse_user_id, require_active_user
+from datetime import datetime
+from utils.auth_helper import (
+    parse_user_id, parse_password_version, require_active_user, verify_user_status, verify_password_version
+)
+from utils.idempotency import idempotent
+from utils.projections import select_checkins
+from utils import checkin_codes, checkin_qr, checkin_writer
+from utils.checkin_sync import parse_records, sync_checkins, CheckInSyncError
 
 checkin_bp = Blueprint('checkin', __name__)
 
+CODE_ERRORS = {
+    checkin_codes.INVALID: '签到码无效',
+    checkin_codes.EXPIRED: '签到码已过期',
+}
+
+QR_ERRORS = {
+    checkin_qr.INVALID: '二维码无效',
+    checkin_qr.EXPIRED: '二维码已过期，请扫描最新的二维码',
+    checkin_qr.MALFORMED: '二维码格式错误',
+}
+
+
 @checkin_bp.route('/qrcode', methods=['POST'])
 @jwt_required()
-@require_active_user
+@idempotent
 def checkin_with_qrcode():
-    """使用二维码签到"""
-    user_id = parse_user_id(get_jwt_identity())
-    user = User.query.get(user_id)
+    """
+    使用二维码签到
     
-    if not user or user.role != 'student':
+    与签到码签到相同走快速路径：二维码的签名和时间窗口只做CPU校验，不查询数据库，
+    任何进程或节点都能独立校验，校验通过后一条条件UPDATE加一条INSERT完成签到
+    """
+    identity = get_jwt_identity()
+    user_id = parse_user_id(identity)
+    
+    if user_id is None:
         return jsonify({'code': 403, 'message': '只有学生可以签到'}), 403
     
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     
     if 'activityId' not in data or 'qrData' not in data:
         return jsonify({'code': 400, 'message': '缺少必填字段'}), 400
     
-    activity_id = data['activityId']
-    
-    # 验证报名记录
-    registration = Registration.query.filter_by(
-        activity_id=activity_id,
-        user_id=user_id
-    ).first()
-    
-    if not registration or registration.status == 'cancelled':
-        return jsonify({'code': 400, 'message': '未报名该活动'}), 400
-    
-    if registration.status == 'checked_in':
-        return jsonify({'code': 400, 'message': '已经签到过了'}), 400
-    
-    # 验证二维码数据（这里简化处理，实际应该验证签名等）
     try:
-        qr_data = json.loads(data['qrData'])
-        if qr_data.get('activityId') != activity_id:
-            return jsonify({'code': 400, 'message': '二维码无效'}), 400
-    except:
-        return jsonify({'code': 400, 'message': '二维码格式错误'}), 400
-    
-    # 创建签到记录
-    checkin = CheckIn(
-        activity_id=activity_id,
-        user_id=user_id,
-        method='qrcode'
-    )
-    db.session.add(checkin)
-    
-    # 更新报名状态
-    registration.status = 'checked_in'
-    registration.checked_in_at = datetime.utcnow()
+        activity_id = int(data['activityId'])
+    except (TypeError, ValueError):
+        return jsonify({'code': 400, 'message': '活动ID无效'}), 400
     
-    db.session.commit()
+    qr_status = checkin_qr.verify(activity_id, data['qrData'])
+    if qr_status != checkin_qr.VALID:
+        return _checkin_failure(identity, activity_id, QR_ERRORS[qr_status])
     
-    return jsonify({
-        'code': 200,
-        'message': '签到成功',
-        'data': checkin.to_dict()
-    })
+    return _record_checkin(identity, user_id, activity_id, 'qrcode')
 
 
 @checkin_bp.route('/code', methods=['POST'])
 @jwt_required()
-@require_active_user
+@idempotent
 def checkin_with_code():
-    """使用签到码签到"""
-    user_id = parse_user_id(get_jwt_identity())
-    user = User.query.get(user_id)
+    """
+    使用签到码签到
     
-    if not user or user.role != 'student':
+    整个教室会在同一分钟内提交签到码，这里不经过require_active_user：
+    签到码在进程内的登记表中校验，用户状态和报名状态的校验合并到一条条件UPDATE中，
+    再加一条INSERT写入签到记录，校验不通过时才逐项查询具体原因
+    """
+    identity = get_jwt_identity()
+    user_id = parse_user_id(identity)
+    
+    if user_id is None:
         return jsonify({'code': 403, 'message': '只有学生可以签到'}), 403
     
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     
     if 'activityId' not in data or 'code' not in data:
         return jsonify({'code': 400, 'message': '缺少必填字段'}), 400
     
-    activity_id = data['activityId']
-    code = data['code']
+    try:
+        activity_id = int(data['activityId'])
+    except (TypeError, ValueError):
+        return jsonify({'code': 400, 'message': '活动ID无效'}), 400
+    code = str(data['code'])
     
-    # 验证报名记录
-    registration = Registration.query.filter_by(
-        activity_id=activity_id,
-        user_id=user_id
-    ).first()
+    code_status = checkin_codes.validate(activity_id, code)
+    if code_status != checkin_codes.VALID:
+        return _checkin_failure(identity, activity_id, CODE_ERRORS[code_status])
+    
+    return _record_checkin(identity, user_id, activity_id, 'code')
+
+
+def _record_checkin(identity, user_id, activity_id, method):
+    """签到凭证校验通过后写入签到记录，快速路径校验不通过时返回具体原因"""
+    # 旧token没有版本信息，默认为版本1
+    token_version = parse_password_version(identity)
+    if token_version is None:
+        token_version = 1
+    
+    if checkin_writer.enabled():
+        # 放入批量提交队列，等待所在批次提交完成
+        try:
+            result = checkin_writer.submit(activity_id, user_id, token_version, method)
+        except checkin_writer.CheckInWriterError:
+            return jsonify({'code': 503, 'message': '签到处理失败，请重试'}), 503
+    else:
+        result = CheckIn.record(activity_id, user_id, token_version, method)
+        if result is None:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    
+    if result is None:
+        return _checkin_failure(identity, activity_id)
+    
+    checkin_id, checked_in_at = result
+    return jsonify({
+        'code': 200,
+        'message': '签到成功',
+        'data': {
+            'id': checkin_id,
+            'activityId': activity_id,
+            'method': method,
+            'checkedInAt': checked_in_at.isoformat() + 'Z'
+        }
+    })
+
+
+def _checkin_failure(identity, activity_id, credential_error=None):
+    """
+    签到快速路径校验不通过时，按原有顺序逐项检查并返回具体原因
+    
+    Args:
+        identity: JWT identity
+        activity_id: 活动ID
+        credential_error: 签到码或二维码校验失败的提示，签到凭证有效时为None
+    """
+    user = User.query.get(parse_user_id(identity))
+    is_valid, error_response_tuple = verify_user_status(user)
+    if not is_valid:
+        return error_response_tuple
+    
+    if not verify_password_version(user, parse_password_version(identity)):
+        return jsonify({'code': 401, 'message': '登录凭证已过期，请重新登录'}), 401
+    
+    if user.role != 'student':
+        return jsonify({'code': 403, 'message': '只有学生可以签到'}), 403
+    
+    registration = Registration.query.filter_by(activity_id=activity_id, user_id=user.id).first()
     
     if not registration or registration.status == 'cancelled':
         return jsonify({'code': 400, 'message': '未报名该活动'}), 400
@@ -99,37 +156,10 @@ def checkin_with_code():
     if registration.status == 'checked_in':
         return jsonify({'code': 400, 'message': '已经签到过了'}), 400
     
-    # 验证签到码
-    checkin_code = CheckInCode.query.filter_by(
-        activity_id=activity_id,
-        code=code
-    ).first()
-    
-    if not checkin_code:
-        return jsonify({'code': 400, 'message': '签到码无效'}), 400
-    
-    if datetime.utcnow() > checkin_code.expires_at:
-        return jsonify({'code': 400, 'message': '签到码已过期'}), 400
-    
-    # 创建签到记录
-    checkin = CheckIn(
-        activity_id=activity_id,
-        user_id=user_id,
-        method='code'
-    )
-    db.session.add(checkin)
-    
-    # 更新报名状态
-    registration.status = 'checked_in'
-    registration.checked_in_at = datetime.utcnow()
-    
-    db.session.commit()
+    if credential_error:
+        return jsonify({'code': 400, 'message': credential_error}), 400
     
-    return jsonify({
-        'code': 200,
-        'message': '签到成功',
-        'data': checkin.to_dict()
-    })
+    return jsonify({'code': 400, 'message': '签到失败，请重试'}), 400
 
 
 @checkin_bp.route('/generate-qr/<int:activity_id>', methods=['POST'])
@@ -146,17 +176,16 @@ def generate_qrcode(activity_id):
     if activity.organizer_id != user_id:
         return jsonify({'code': 403, 'message': '权限不足'}), 403
     
-    # 生成二维码数据
-    qr_data = json.dumps({
-        'activityId': activity_id,
-        'timestamp': datetime.utcnow().isoformat() + 'Z'
-    })
+    # 生成当前时间窗口的签名二维码，组织者端在expiresAt之前重新获取
+    qr_data, expires_at = checkin_qr.generate(activity_id)
     
     return jsonify({
         'code': 200,
         'message': '生成成功',
         'data': {
-            'qrData': qr_data
+            'qrData': qr_data,
+            'expiresAt': expires_at.isoformat() + 'Z',
+            'rotationSeconds': current_app.config['CHECKIN_QR_ROTATION']
         }
     })
 
@@ -183,26 +212,45 @@ def generate_code(activity_id):
     if not isinstance(duration, int) or duration < 5 or duration > 30:
         return jsonify({'code': 400, 'message': '签到时长必须在5-30分钟之间'}), 400
     
-    # 生成6位随机数字码
-    code = ''.join(random.choices(string.digits, k=6))
+    # 生成6位随机数字码，在有效签到码登记表中查重，写入数据库后登记
+    checkin_code = checkin_codes.generate(activity_id, duration)
+    if checkin_code is None:
+        return jsonify({'code': 503, 'message': '签到码生成失败，请重试'}), 503
+    
+    return jsonify({
+        'code': 200,
+        'message': '生成成功',
+        'data': checkin_code.to_dict()
+    })
+
+
+@checkin_bp.route('/bulk/<int:activity_id>', methods=['POST'])
+@jwt_required()
+@idempotent
+@require_active_user
+def bulk_sync_checkins(activity_id):
+    """批量同步离线扫描的签到记录（组织者）"""
+    user_id = parse_user_id(get_jwt_identity())
+    activity = Activity.query.get(activity_id)
+    
+    if not activity:
+        return jsonify({'code': 404, 'message': '活动不存在'}), 404
     
-    # 检查是否重复
-    while CheckInCode.query.filter_by(code=code).first():
-        code = ''.join(random.choices(string.digits, k=6))
+    if activity.organizer_id != user_id:
+        return jsonify({'code': 403, 'message': '权限不足'}), 403
     
-    # 创建签到码，使用自定义有效期
-    checkin_code = CheckInCode(
-        activity_id=activity_id,
-        code=code,
-        expires_at=datetime.utcnow() + timedelta(minutes=duration)
-    )
-    db.session.add(checkin_code)
+    try:
+        records = parse_records(request.get_json(silent=True), current_app.config['CHECKIN_BULK_MAX_RECORDS'])
+    except CheckInSyncError as e:
+        return jsonify({'code': 400, 'message': str(e)}), 400
+    
+    report = sync_checkins(activity_id, records)
     db.session.commit()
     
     return jsonify({
         'code': 200,
-        'message': '生成成功',
-        'data': checkin_code.to_dict()
+        'message': f"同步完成：签到 {report['checkedIn']} 人，跳过 {report['skipped']} 条，失败 {report['failed']} 条",
+        'data': report
     })
 
 
@@ -220,14 +268,14 @@ def get_activity_checkins(activity_id):
     if activity.organizer_id != user_id:
         return jsonify({'code': 403, 'message': '权限不足'}), 403
     
-    checkins = CheckIn.query.filter_by(activity_id=activity_id).order_by(
-        CheckIn.checked_in_at.desc()
+    checkins = db.session.execute(
+        select_checkins().where(CheckIn.activity_id == activity_id).order_by(CheckIn.checked_in_at.desc())
     ).all()
     
     return jsonify({
         'code': 200,
         'message': '获取成功',
-        'data': [checkin.to_dict() for checkin in checkins]
+        'data': CheckIn.to_dict_list(checkins)
     })
 
 
@@ -276,19 +324,20 @@ def get_my_recent_checkins():
     if not user or user.role != 'student':
         return jsonify({'code': 403, 'message': '只有学生可以查看签到记录'}), 403
     
-    # 获取最近10条签到记录
-    checkins = CheckIn.query.filter_by(user_id=user_id).order_by(
-        CheckIn.checked_in_at.desc()
-    ).limit(10).all()
+    # 获取最近10条签到记录，连接活动表一并查询活动标题
+    checkins = db.session.execute(
+        select_checkins().add_columns(Activity.title.label('activity_title')).outerjoin(
+            Activity, Activity.id == CheckIn.activity_id
+        ).where(CheckIn.user_id == user_id).order_by(CheckIn.checked_in_at.desc()).limit(10)
+    ).all()
     
     # 构建返回数据，包含活动信息
     result = []
     for checkin in checkins:
-        activity = Activity.query.get(checkin.activity_id)
         checkin_data = {
             'id': checkin.id,
             'activityId': checkin.activity_id,
-            'activityTitle': activity.title if activity else '未知活动',
+            'activityTitle': checkin.activity_title or '未知活动',
             'userId': checkin.user_id,
             'method': checkin.method,
             'checkedInAt': checkin.checked_in_at.isoformat() + 'Z'
@@ -324,6 +373,7 @@ def end_checkin(activity_id):
     ).update({'expires_at': now})
     
     db.session.commit()
+    checkin_codes.evict_activity(activity_id)
     
     return jsonify({
         'code': 200,
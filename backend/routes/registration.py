@@ -1,13 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Registration, Activity, User
+from models import db, Registration, Activity, User, ActivitySubItem, WaitlistEntry
 from datetime import datetime
 from utils.auth_helper import parse_user_id, require_active_user
+from utils.idempotency import idempotent
+from utils.projections import select_registrations, paginate_rows, paginate_keyset
+from utils import response_cache, admission_queue
+from utils.roster_import import parse_roster, import_roster, RosterError
 
 registration_bp = Blueprint('registration', __name__)
 
 @registration_bp.route('/<int:activity_id>', methods=['POST'])
 @jwt_required()
+@idempotent
 @require_active_user
 def register_activity(activity_id):
     """报名活动"""
@@ -21,7 +26,7 @@ def register_activity(activity_id):
     if not activity:
         return jsonify({'code': 404, 'message': '活动不存在'}), 404
     
-    # 检查是否已报名
+    # 以下检查只用于快速失败，最终以事务中的条件写入为准
     existing = Registration.query.filter_by(
         activity_id=activity_id, 
         user_id=user_id
@@ -33,40 +38,114 @@ def register_activity(activity_id):
     if datetime.utcnow() > activity.registration_deadline:
         return jsonify({'code': 400, 'message': '报名已截止'}), 400
     
+    # 获取选择的子项目（如果有），waitlist为True时名额已满则加入候补名单
+    data = request.get_json() or {}
+    sub_item = data.get('subItem')
+    join_waitlist = bool(data.get('waitlist'))
+    
+    if sub_item is not None and sub_item not in activity.sub_item_names():
+        return jsonify({'code': 400, 'message': '子项目不存在'}), 400
+    
+    # 检查与已报名活动的时间冲突
+    conflict_mode = current_app.config['SCHEDULE_CONFLICT_MODE']
+    conflicts = []
+    if conflict_mode in ('warn', 'reject'):
+        conflicts = [{
+            'id': row.id,
+            'title': row.title,
+            'startTime': row.start_time.isoformat() + 'Z',
+            'endTime': row.end_time.isoformat() + 'Z'
+        } for row in Registration.schedule_conflicts(user_id, activity)]
+    if conflicts and conflict_mode == 'reject':
+        return jsonify({
+            'code': 400,
+            'message': '与已报名的活动时间冲突',
+            'data': {'scheduleConflicts': conflicts}
+        }), 400
+    
     # 检查人数限制
     if activity.current_participants >= activity.max_participants:
-        return jsonify({'code': 400, 'message': '活动名额已满'}), 400
+        if join_waitlist:
+            return _join_waitlist(activity_id, user_id, sub_item, Registration.ERROR_FULL)
+        return jsonify({'code': 400, 'message': Registration.ERROR_FULL}), 400
     
-    # 获取选择的子项目（如果有）
-    data = request.get_json() or {}
-    sub_item = data.get('subItem')
+    # 排队模式：放入队列后立即返回凭证，由后台线程批量处理
+    if activity.admission_mode == 'queued':
+        try:
+            ticket, position = admission_queue.enqueue(activity_id, user_id, sub_item, join_waitlist)
+        except admission_queue.QueueFullError:
+            return jsonify({'code': 503, 'message': '当前报名人数过多，请稍后重试'}), 503
+        data = dict(ticket.to_dict(), position=position)
+        if conflicts:
+            data['scheduleConflicts'] = conflicts
+        return jsonify({
+            'code': 202,
+            'message': '已进入报名队列',
+            'data': data
+        }), 202
     
-    # 创建报名记录
-    if existing:
-        existing.status = 'registered'
-        existing.registered_at = datetime.utcnow()
-        existing.sub_item = sub_item
-        registration = existing
-    else:
-        registration = Registration(
-            activity_id=activity_id,
-            user_id=user_id,
-            status='registered',
-            sub_item=sub_item
-        )
-        db.session.add(registration)
-    
-    # 更新活动参与人数
-    activity.current_participants += 1
+    # 占用名额并写入报名记录，条件写入在同一个短事务中完成
+    error = Registration.admit(activity_id, user_id, sub_item)
+    if error in Registration.CAPACITY_ERRORS and join_waitlist:
+        db.session.rollback()
+        return _join_waitlist(activity_id, user_id, sub_item, error)
+    if error:
+        db.session.rollback()
+        return jsonify({'code': 400, 'message': error}), 400
     db.session.commit()
+    response_cache.invalidate_activity(activity_id)
+    
+    registration = Registration.query.filter_by(activity_id=activity_id, user_id=user_id).first()
+    data = registration.to_dict()
+    if conflicts:
+        data['scheduleConflicts'] = conflicts
     
     return jsonify({
         'code': 200,
-        'message': '报名成功',
-        'data': registration.to_dict()
+        'message': '报名成功，但与已报名的活动时间冲突' if conflicts else '报名成功',
+        'data': data
     }), 201
 
 
+def _join_waitlist(activity_id, user_id, sub_item, reason):
+    """加入候补名单并返回排位，reason为名额不足的原因"""
+    if not WaitlistEntry.join(activity_id, user_id, sub_item):
+        db.session.rollback()
+        return jsonify({'code': 400, 'message': '已在候补名单中'}), 400
+    db.session.commit()
+    
+    return jsonify({
+        'code': 202,
+        'message': f'{reason}，已加入候补名单',
+        'data': {'waitlist': WaitlistEntry.position_of(activity_id, user_id)}
+    }), 202
+
+
+@registration_bp.route('/tickets/<ticket_id>', methods=['GET'])
+@jwt_required()
+@require_active_user
+def get_registration_ticket(ticket_id):
+    """查询排队报名的处理结果"""
+    user_id = parse_user_id(get_jwt_identity())
+    
+    ticket = admission_queue.get_ticket(ticket_id)
+    if not ticket or ticket.user_id != user_id:
+        return jsonify({'code': 404, 'message': '排队凭证不存在或已过期'}), 404
+    
+    data = ticket.to_dict()
+    if ticket.status == admission_queue.SUCCEEDED:
+        registration = Registration.query.filter_by(activity_id=ticket.activity_id, user_id=user_id).first()
+        data['registration'] = registration.to_dict() if registration else None
+    elif ticket.status == admission_queue.WAITLISTED:
+        data['waitlist'] = WaitlistEntry.position_of(ticket.activity_id, user_id)
+    
+    return jsonify({
+        'code': 200,
+        'message': '获取成功',
+        'data': data
+    })
+
+
 @registration_bp.route('/<int:activity_id>', methods=['DELETE'])
 @jwt_required()
 @require_active_user
@@ -80,21 +159,31 @@ def cancel_registration(activity_id):
     ).first()
     
     if not registration or registration.status == 'cancelled':
+        # 没有有效报名时，退出候补名单
+        if WaitlistEntry.leave(activity_id, user_id):
+            db.session.commit()
+            return jsonify({'code': 200, 'message': '已退出候补名单'})
         return jsonify({'code': 404, 'message': '未找到报名记录'}), 404
     
     # 不允许取消已签到的报名
     if registration.status == 'checked_in':
         return jsonify({'code': 400, 'message': '已签到的活动不能取消报名'}), 400
     
-    # 更新状态
-    registration.status = 'cancelled'
+    # 条件更新状态，并发的重复取消只会释放一次名额
+    cancelled = Registration.query.filter_by(id=registration.id, status='registered').update(
+        {'status': 'cancelled'}, synchronize_session=False
+    )
+    if not cancelled:
+        db.session.rollback()
+        return jsonify({'code': 404, 'message': '未找到报名记录'}), 404
     
-    # 更新活动参与人数
-    activity = Activity.query.get(activity_id)
-    if activity.current_participants > 0:
-        activity.current_participants -= 1
+    # 更新活动参与人数和子项目计数，空出的名额在同一事务中转给候补名单队首
+    Activity.release_seat(activity_id)
+    ActivitySubItem.adjust(activity_id, registration.sub_item, -1)
+    WaitlistEntry.promote_next(activity_id, registration.sub_item)
     
     db.session.commit()
+    response_cache.invalidate_activity(activity_id)
     
     return jsonify({
         'code': 200,
@@ -115,19 +204,50 @@ def get_my_registrations():
     
     page = request.args.get('page', 1, type=int)
     page_size = request.args.get('pageSize', 10, type=int)
+    activity_summary = request.args.get('view') == 'summary'
+    
+    # 带cursor参数时使用键集分页（第一页cursor为空），每页耗时与历史记录数无关
+    if 'cursor' in request.args:
+        try:
+            keyset = paginate_keyset(
+                select_registrations().where(
+                    Registration.user_id == user_id,
+                    Registration.status != 'cancelled'
+                ),
+                Registration.registered_at, Registration.id,
+                request.args.get('cursor'), page_size
+            )
+        except ValueError:
+            return jsonify({'code': 400, 'message': '无效的分页游标'}), 400
+        
+        if activity_summary:
+            items = Registration.to_slim_dict_list(keyset.items)
+        else:
+            items = Registration.to_dict_list(keyset.items)
+        return jsonify({
+            'code': 200,
+            'message': '获取成功',
+            'data': {
+                'items': items,
+                'nextCursor': keyset.next_cursor,
+                'pageSize': keyset.per_page
+            }
+        })
     
     # 只查询未取消的报名
-    pagination = Registration.query.filter_by(user_id=user_id).filter(
-        Registration.status != 'cancelled'
-    ).order_by(Registration.registered_at.desc()).paginate(
-        page=page, per_page=page_size, error_out=False, max_per_page=100
+    pagination = paginate_rows(
+        select_registrations().where(
+            Registration.user_id == user_id,
+            Registration.status != 'cancelled'
+        ).order_by(Registration.registered_at.desc()),
+        page, page_size
     )
     
     return jsonify({
         'code': 200,
         'message': '获取成功',
         'data': {
-            'items': [reg.to_dict() for reg in pagination.items],
+            'items': Registration.to_dict_list(pagination.items, activity_summary=activity_summary),
             'total': pagination.total,
             'page': page,
             'pageSize': page_size,
@@ -152,18 +272,21 @@ def get_activity_registrations(activity_id):
     
     page = request.args.get('page', 1, type=int)
     page_size = request.args.get('pageSize', 20, type=int)
+    activity_summary = request.args.get('view') == 'summary'
     
-    pagination = Registration.query.filter_by(activity_id=activity_id).filter(
-        Registration.status != 'cancelled'
-    ).order_by(Registration.registered_at.desc()).paginate(
-        page=page, per_page=page_size, error_out=False, max_per_page=100
+    pagination = paginate_rows(
+        select_registrations().where(
+            Registration.activity_id == activity_id,
+            Registration.status != 'cancelled'
+        ).order_by(Registration.registered_at.desc()),
+        page, page_size
     )
     
     return jsonify({
         'code': 200,
         'message': '获取成功',
         'data': {
-            'items': [reg.to_dict() for reg in pagination.items],
+            'items': Registration.to_dict_list(pagination.items, activity_summary=activity_summary),
             'total': pagination.total,
             'page': page,
             'pageSize': page_size,
@@ -172,6 +295,85 @@ def get_activity_registrations(activity_id):
     })
 
 
+@registration_bp.route('/activity/<int:activity_id>/import', methods=['POST'])
+@jwt_required()
+@require_active_user
+def import_activity_registrations(activity_id):
+    """批量导入报名名单（组织者，CSV或XLSX：学号、子项目）"""
+    user_id = parse_user_id(get_jwt_identity())
+    activity = Activity.query.get(activity_id)
+    
+    if not activity:
+        return jsonify({'code': 404, 'message': '活动不存在'}), 404
+    
+    if activity.organizer_id != user_id:
+        return jsonify({'code': 403, 'message': '权限不足'}), 403
+    
+    if datetime.utcnow() > activity.end_time:
+        return jsonify({'code': 400, 'message': '已结束的活动不能导入报名'}), 400
+    
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return jsonify({'code': 400, 'message': '没有选择文件'}), 400
+    
+    try:
+        rows = parse_roster(request.files['file'], current_app.config['ROSTER_IMPORT_MAX_ROWS'])
+    except RosterError as e:
+        return jsonify({'code': 400, 'message': str(e)}), 400
+    
+    if not rows:
+        return jsonify({'code': 400, 'message': '名单为空'}), 400
+    
+    report = import_roster(activity, rows)
+    db.session.commit()
+    if report['registered']:
+        response_cache.invalidate_activity(activity_id)
+    
+    return jsonify({
+        'code': 200,
+        'message': f"导入完成：成功 {report['registered']} 人，跳过 {report['skipped']} 人，失败 {report['failed']} 人",
+        'data': report
+    })
+
+
+@registration_bp.route('/status', methods=['GET'])
+@jwt_required()
+@require_active_user
+def check_registration_statuses():
+    """批量检查报名状态（活动列表页使用，ids为逗号分隔的活动ID）"""
+    user_id = parse_user_id(get_jwt_identity())
+    
+    try:
+        activity_ids = list(dict.fromkeys(
+            int(value) for value in request.args.get('ids', '').split(',') if value.strip()
+        ))
+    except ValueError:
+        return jsonify({'code': 400, 'message': '无效的活动ID'}), 400
+    
+    if len(activity_ids) > current_app.config['REGISTRATION_STATUS_MAX_IDS']:
+        return jsonify({
+            'code': 400,
+            'message': f"单次最多查询 {current_app.config['REGISTRATION_STATUS_MAX_IDS']} 个活动"
+        }), 400
+    
+    # 一次查询，使用 (activity_id, user_id) 唯一索引，未报名的活动为null
+    statuses = dict.fromkeys(activity_ids)
+    if activity_ids:
+        for activity_id, status, sub_item in db.session.query(
+            Registration.activity_id, Registration.status, Registration.sub_item
+        ).filter(
+            Registration.user_id == user_id,
+            Registration.activity_id.in_(activity_ids),
+            Registration.status != 'cancelled'
+        ):
+            statuses[activity_id] = {'status': status, 'subItem': sub_item}
+    
+    return jsonify({
+        'code': 200,
+        'message': '获取成功',
+        'data': statuses
+    })
+
+
 @registration_bp.route('/status/<int:activity_id>', methods=['GET'])
 @jwt_required()
 @require_active_user
@@ -189,6 +391,7 @@ def check_registration_status(activity_id):
         'message': '获取成功',
         'data': {
             'isRegistered': registration is not None,
-            'registration': registration.to_dict() if registration else None
+            'registration': registration.to_dict() if registration else None,
+            'waitlist': None if registration else WaitlistEntry.position_of(activity_id, user_id)
         }
     })
@@ -7,6 +7,7 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill
 from io import BytesIO
 from utils.auth_helper import parse_user_id, require_active_user
+from utils.projections import select_activities
 
 statistics_bp = Blueprint('statistics', __name__)
 
@@ -98,9 +99,9 @@ def get_organizer_statistics():
     average_check_in_rate = round(total_checkins / total_registrations * 100, 2) if total_registrations > 0 else 0
     
     # 最近的活动
-    recent_activities = Activity.query.filter_by(organizer_id=user_id).order_by(
-        Activity.created_at.desc()
-    ).limit(5).all()
+    recent_activities = db.session.execute(
+        select_activities().where(Activity.organizer_id == user_id).order_by(Activity.created_at.desc()).limit(5)
+    ).all()
     
     return jsonify({
         'code': 200,
@@ -110,7 +111,7 @@ def get_organizer_statistics():
             'totalRegistrations': total_registrations,
             'totalCheckIns': total_checkins,
             'averageCheckInRate': average_check_in_rate,
-            'recentActivities': [activity.to_dict() for activity in recent_activities]
+            'recentActivities': Activity.to_dict_list(recent_activities)
         }
     })
 
@@ -134,13 +135,7 @@ def export_statistics(activity_id):
         return jsonify({'code': 403, 'message': '权限不足'}), 403
     
     # 判断活动状态
-    now = datetime.utcnow()
-    if now < activity.start_time:
-        activity_status = 'upcoming'
-    elif now >= activity.start_time and now <= activity.end_time:
-        activity_status = 'ongoing'
-    else:
-        activity_status = 'completed'
+    activity_status = Activity.lifecycle_status(activity.start_time, activity.end_time)
     
     # 创建Excel工作簿
     wb = Workbook()
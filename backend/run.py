@@ -1,7 +1,7 @@
 """
 快速启动脚本
 """
-from app import create_app
+from app import create_app, start_background_jobs
 from models import db
 
 if __name__ == '__main__':
@@ -11,6 +11,10 @@ if __name__ == '__main__':
     with app.app_context():
         db.create_all()
     
+    # 调试模式运行（启用自动重载），后台任务只在提供服务的进程中启动
+    app.debug = True
+    start_background_jobs(app)
+    
     print("="*60)
     print("班级活动报名系统 - 后端 API")
     print("="*60)
@@ -21,4 +25,4 @@ if __name__ == '__main__':
     print("\n按 Ctrl+C 停止服务器\n")
     
     # 运行应用
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,215 @@
+"""
+测试子项目人数上限
+
+前端以 subItems[].maxParticipants 保存子项目人数上限，创建活动后同一子项目报名超过上限时
+应被拒绝，选择候补时加入候补名单；空出名额时只转正有空位的子项目的候补，
+释放的子项目名额无法占用时继续查找后面的候补，报名截止后不再转正；
+升级前创建、没有计数器行的活动在运行迁移脚本后可以正常报名。
+使用临时数据库，可以直接运行或用pytest运行
+"""
+import os
+import tempfile
+
+# 必须在导入应用之前指定临时数据库
+_db_fd, DB_PATH = tempfile.mkstemp(suffix='.db')
+os.close(_db_fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from datetime import datetime, timedelta
+from models import db, User, Activity, ActivitySubItem, Registration, WaitlistEntry
+from migrate_add_sub_item_max import migrate
+
+app = create_app()
+with app.app_context():
+    db.create_all()
+
+
+def _setup(prefix, count):
+    with app.app_context():
+        organizer = User(username=f'organizer{prefix}', email=f'organizer{prefix}@organizer.local', role='organizer')
+        organizer.set_password('123456')
+        students = []
+        for i in range(count):
+            student = User(username=f'{prefix}{i:04d}', email=f'{prefix}{i:04d}@student.local', role='student')
+            student.set_password('123456')
+            students.append(student)
+        db.session.add_all([organizer] + students)
+        db.session.commit()
+        tokens = {
+            'organizer': create_access_token(identity=f'{organizer.id}_v1'),
+            'students': [create_access_token(identity=f'{student.id}_v1') for student in students],
+        }
+        student_ids = [student.id for student in students]
+    return tokens, student_ids
+
+
+def _create_activity(client, token, max_participants, sub_items):
+    response = client.post('/api/activities', headers={'Authorization': f'Bearer {token}'}, json={
+        'title': '羽毛球赛', 'description': '子项目人数上限测试', 'category': 'sports',
+        'startTime': '2099-01-01T10:00:00Z', 'endTime': '2099-01-01T12:00:00Z',
+        'location': '体育馆', 'maxParticipants': max_participants, 'registrationDeadline': '2098-12-31T00:00:00Z',
+        'subItems': sub_items
+    })
+    assert response.status_code in (200, 201), response.get_json()
+    return response.get_json()['data']['id']
+
+
+def test_max_participants_limits_sub_item():
+    tokens, student_ids = _setup('2024', 3)
+    client = app.test_client()
+    activity_id = _create_activity(client, tokens['organizer'], 10,
+                                   [{'name': '男双', 'maxParticipants': 1}, {'name': '女双', 'maxParticipants': 9}])
+
+    def register(index, waitlist=False):
+        return client.post(f'/api/registrations/{activity_id}',
+                           headers={'Authorization': f"Bearer {tokens['students'][index]}"},
+                           json={'subItem': '男双', 'waitlist': waitlist})
+
+    first = register(0)
+    assert first.status_code == 201, first.get_json()
+
+    second = register(1)
+    assert second.status_code == 400, second.get_json()
+    assert second.get_json()['message'] == Registration.ERROR_SUB_ITEM_FULL
+
+    third = register(2, waitlist=True)
+    assert third.status_code < 300 and third.get_json()['data'].get('waitlist'), third.get_json()
+
+    with app.app_context():
+        assert Registration.query.filter_by(activity_id=activity_id, sub_item='男双').count() == 1
+        assert WaitlistEntry.query.filter_by(activity_id=activity_id, user_id=student_ids[2]).count() == 1
+
+
+def test_promotion_skips_full_sub_items():
+    tokens, student_ids = _setup('2025', 26)
+    client = app.test_client()
+    activity_id = _create_activity(client, tokens['organizer'], 2,
+                                   [{'name': '男双', 'maxParticipants': 1}, {'name': '女双', 'maxParticipants': 5}])
+
+    def register(index, sub_item, waitlist=False):
+        response = client.post(f'/api/registrations/{activity_id}',
+                               headers={'Authorization': f"Bearer {tokens['students'][index]}"},
+                               json={'subItem': sub_item, 'waitlist': waitlist})
+        assert response.status_code < 300, response.get_json()
+
+    register(0, '男双')
+    register(1, '女双')
+    # 活动已满，候补名单前面是23个男双（子项目已满），最后是一个女双
+    for index in range(2, 25):
+        register(index, '男双', waitlist=True)
+    register(25, '女双', waitlist=True)
+
+    def registered(index):
+        with app.app_context():
+            return Registration.query.filter_by(activity_id=activity_id, user_id=student_ids[index],
+                                                status='registered').count() == 1
+
+    # 活动扩容：队首的男双都没有空位，转正队尾的女双
+    response = client.put(f'/api/activities/{activity_id}',
+                          headers={'Authorization': f"Bearer {tokens['organizer']}"}, json={'maxParticipants': 3})
+    assert response.status_code == 200, response.get_json()
+    assert registered(25)
+    assert not registered(2)
+
+    # 男双名额空出：转正男双的队首
+    response = client.delete(f'/api/registrations/{activity_id}',
+                             headers={'Authorization': f"Bearer {tokens['students'][0]}"})
+    assert response.status_code == 200, response.get_json()
+    assert registered(2)
+    assert not registered(3)
+    with app.app_context():
+        assert WaitlistEntry.query.filter_by(activity_id=activity_id).count() == 22
+
+
+def test_migration_creates_missing_counters():
+    tokens, student_ids = _setup('2026', 2)
+    client = app.test_client()
+    activity_id = _create_activity(client, tokens['organizer'], 10,
+                                   [{'name': '男双', 'maxParticipants': 2}, {'name': '女双'}])
+
+    def register(index, sub_item):
+        return client.post(f'/api/registrations/{activity_id}',
+                           headers={'Authorization': f"Bearer {tokens['students'][index]}"},
+                           json={'subItem': sub_item})
+
+    assert register(0, '男双').status_code == 201
+    # 模拟升级前创建的活动：没有子项目计数器行
+    with app.app_context():
+        ActivitySubItem.query.filter_by(activity_id=activity_id).delete()
+        db.session.commit()
+    assert register(1, '女双').status_code == 400
+
+    migrate()
+    with app.app_context():
+        counters = {counter.name: (counter.current_participants, counter.max_participants)
+                    for counter in ActivitySubItem.query.filter_by(activity_id=activity_id)}
+    assert counters == {'男双': (1, 2), '女双': (0, None)}, counters
+    response = register(1, '女双')
+    assert response.status_code == 201, response.get_json()
+
+
+def test_promotion_falls_through_and_stops_after_deadline():
+    tokens, student_ids = _setup('2027', 5)
+    client = app.test_client()
+    activity_id = _create_activity(client, tokens['organizer'], 2,
+                                   [{'name': '男双', 'maxParticipants': 1}, {'name': '女双'}])
+
+    def register(index, sub_item, waitlist=False):
+        response = client.post(f'/api/registrations/{activity_id}',
+                               headers={'Authorization': f"Bearer {tokens['students'][index]}"},
+                               json={'subItem': sub_item, 'waitlist': waitlist})
+        assert response.status_code < 300, response.get_json()
+
+    def cancel(index):
+        response = client.delete(f'/api/registrations/{activity_id}',
+                                 headers={'Authorization': f"Bearer {tokens['students'][index]}"})
+        assert response.status_code == 200, response.get_json()
+
+    def registered(index):
+        with app.app_context():
+            return Registration.query.filter_by(activity_id=activity_id, user_id=student_ids[index],
+                                                status='registered').count() == 1
+
+    register(0, '男双')
+    register(1, '女双')
+    register(2, '男双', waitlist=True)
+    register(3, '女双', waitlist=True)
+    register(4, '女双', waitlist=True)
+    with app.app_context():
+        assert WaitlistEntry.position_of(activity_id, student_ids[3]) == {'position': 2, 'subItem': '女双'}
+        # 男双的计数器行缺失，男双候补队首无法占用子项目名额
+        ActivitySubItem.query.filter_by(activity_id=activity_id, name='男双').delete()
+        db.session.commit()
+
+    # 释放的男双名额无法占用时，继续转正后面的女双候补
+    cancel(0)
+    assert registered(3)
+    assert not registered(2)
+
+    # 报名截止后空出的名额不再转正
+    with app.app_context():
+        Activity.query.filter_by(id=activity_id).update(
+            {'registration_deadline': datetime.utcnow() - timedelta(minutes=1)})
+        db.session.commit()
+    cancel(1)
+    assert not registered(4)
+    with app.app_context():
+        assert db.session.get(Activity, activity_id).current_participants == 1
+        assert WaitlistEntry.query.filter_by(activity_id=activity_id).count() == 2
+
+
+def teardown_module(module=None):
+    with app.app_context():
+        db.engine.dispose()
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    test_max_participants_limits_sub_item()
+    test_promotion_skips_full_sub_items()
+    test_migration_creates_missing_counters()
+    test_promotion_falls_through_and_stops_after_deadline()
+    teardown_module()
+    print("✓ 子项目人数上限测试通过")
@@ -0,0 +1,28 @@
+"""
+活动状态维护任务
+"""
+from datetime import datetime
+from models import db, Activity
+
+
+def sync_activity_statuses(now=None):
+    """
+    按开始/结束时间批量修正活动的存储状态（已取消的活动除外）
+    
+    每个目标状态对应一条基于时间索引的UPDATE语句，只更新状态需要变化的行
+    
+    Args:
+        now: 当前UTC时间，默认为datetime.utcnow()
+        
+    Returns:
+        dict: 每个状态被更新的活动数
+    """
+    now = now or datetime.utcnow()
+    result = {}
+    for status in ('upcoming', 'ongoing', 'completed'):
+        result[status] = Activity.query.filter(
+            Activity.status_filter(status, now),
+            db.or_(Activity.status.is_(None), Activity.status != status)
+        ).update({'status': status}, synchronize_session=False)
+    db.session.commit()
+    return result
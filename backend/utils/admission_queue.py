@@ -0,0 +1,178 @@
+"""
+排队报名
+
+admission_mode为queued的活动，报名请求不直接写数据库，而是放入进程内队列并立即返回排队凭证。
+单个后台线程从队列中批量取出请求，在一个事务中依次占用名额、写入报名记录后统一提交，
+客户端通过凭证轮询处理结果。这样报名高峰时Web线程不会堆积在数据库写锁上，
+吞吐由批量大小决定，比较稳定。
+
+处理完成的凭证按完成时间依次记入 _finished，入队时只从队首弹出过期凭证，不遍历全部凭证。
+
+队列和凭证只保存在当前进程内，服务重启后未处理的请求会丢失，客户端查询凭证得到404后应重新报名
+"""
+import queue
+import threading
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, Activity, Registration, WaitlistEntry
+from utils import response_cache
+
+QUEUED = 'queued'
+SUCCEEDED = 'succeeded'
+WAITLISTED = 'waitlisted'
+FAILED = 'failed'
+
+
+class Ticket:
+    """排队凭证"""
+    __slots__ = ('id', 'activity_id', 'user_id', 'sub_item', 'waitlist', 'status', 'message', 'created_at',
+                 'finished_at')
+
+    def __init__(self, activity_id, user_id, sub_item, waitlist=False):
+        self.id = uuid.uuid4().hex
+        self.activity_id = activity_id
+        self.user_id = user_id
+        self.sub_item = sub_item
+        self.waitlist = waitlist
+        self.status = QUEUED
+        self.message = '排队中'
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'ticket': self.id,
+            'activityId': self.activity_id,
+            'status': self.status,
+            'message': self.message,
+            'createdAt': self.created_at.isoformat() + 'Z',
+            'finishedAt': self.finished_at.isoformat() + 'Z' if self.finished_at else None
+        }
+
+
+_queue = queue.Queue()
+# 凭证ID -> Ticket
+_tickets = {}
+# (处理完成时间, 凭证ID)，按处理完成的顺序排列
+_finished = deque()
+# (活动ID, 用户ID) -> 排队中的Ticket，同一用户重复提交时返回原凭证
+_pending = {}
+_lock = threading.Lock()
+_worker = None
+
+
+class QueueFullError(Exception):
+    """排队人数达到上限"""
+
+
+def enqueue(activity_id, user_id, sub_item, waitlist=False):
+    """
+    将报名请求加入队列，waitlist为True时名额已满则加入候补名单
+
+    Returns:
+        tuple: (Ticket, 排队位置)
+
+    Raises:
+        QueueFullError: 队列已满
+    """
+    config = current_app.config
+    _ensure_worker(current_app._get_current_object())
+
+    with _lock:
+        _purge_expired(config['REGISTRATION_TICKET_TTL'])
+        ticket = _pending.get((activity_id, user_id))
+        if ticket:
+            return ticket, _queue.qsize()
+        if _queue.qsize() >= config['REGISTRATION_QUEUE_MAX_SIZE']:
+            raise QueueFullError()
+        ticket = Ticket(activity_id, user_id, sub_item, waitlist)
+        _tickets[ticket.id] = ticket
+        _pending[(activity_id, user_id)] = ticket
+        _queue.put(ticket)
+        return ticket, _queue.qsize()
+
+
+def get_ticket(ticket_id):
+    """查询凭证，不存在或已过期时返回None"""
+    with _lock:
+        return _tickets.get(ticket_id)
+
+
+def _purge_expired(ttl):
+    """删除队首处理完成超过ttl秒的凭证（调用方持有锁）"""
+    deadline = datetime.utcnow() - timedelta(seconds=ttl)
+    while _finished and _finished[0][0] < deadline:
+        _tickets.pop(_finished.popleft()[1], None)
+
+
+def _ensure_worker(app):
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, args=(app,), name='registration-queue', daemon=True)
+            _worker.start()
+
+
+def _run(app):
+    batch_size = app.config['REGISTRATION_QUEUE_BATCH_SIZE']
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < batch_size:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        with app.app_context():
+            results = process_batch(batch)
+            db.session.remove()
+
+        finished_at = datetime.utcnow()
+        with _lock:
+            for ticket in batch:
+                ticket.status, ticket.message = results[ticket.id]
+                ticket.finished_at = finished_at
+                _finished.append((finished_at, ticket.id))
+                _pending.pop((ticket.activity_id, ticket.user_id), None)
+
+        for activity_id in {ticket.activity_id for ticket in batch
+                            if ticket.status == SUCCEEDED}:
+            response_cache.invalidate_activity(activity_id)
+
+
+def process_batch(batch):
+    """
+    在一个事务中处理一批报名请求
+
+    Returns:
+        dict: {凭证ID: (状态, 消息)}
+    """
+    results = {}
+    try:
+        now = datetime.utcnow()
+        deadlines = dict(db.session.query(Activity.id, Activity.registration_deadline).filter(
+            Activity.id.in_({ticket.activity_id for ticket in batch})
+        ).all())
+        for ticket in batch:
+            deadline = deadlines.get(ticket.activity_id)
+            if deadline is None:
+                results[ticket.id] = (FAILED, '活动不存在')
+            elif now > deadline:
+                results[ticket.id] = (FAILED, '报名已截止')
+            else:
+                error = Registration.admit(ticket.activity_id, ticket.user_id, ticket.sub_item)
+                if not error:
+                    results[ticket.id] = (SUCCEEDED, '报名成功')
+                elif error in Registration.CAPACITY_ERRORS and ticket.waitlist and \
+                        WaitlistEntry.join(ticket.activity_id, ticket.user_id, ticket.sub_item):
+                    results[ticket.id] = (WAITLISTED, f'{error}，已加入候补名单')
+                else:
+                    results[ticket.id] = (FAILED, error)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"[registration-queue] 批量报名失败: {e}")
+        results = {ticket.id: (FAILED, '报名处理失败，请重新报名') for ticket in batch}
+    return results
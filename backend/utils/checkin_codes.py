@@ -0,0 +1,167 @@
+"""
+有效签到码登记表
+
+进程内按签到码保存所有未过期的签到码，生成和校验签到码都是一次字典查找，不再逐次查询 checkin_codes 表：
+  - 过期时间用最小堆排序，每次访问时弹出已过期的签到码
+  - 生成签到码时随机选取不在登记表中的号码，写入 checkin_codes 后再登记（write-through）。
+    号码被同一活动过期的旧签到码、或其他活动过期超过 EXPIRED_CODE_RETENTION 的签到码占用时复用该行，
+    表的大小不会随生成次数无限增长；其他活动刚过期的签到码保留，学生输入时仍提示“已过期”
+  - 结束签到时立即移除该活动的所有签到码
+  - 登记表中没有的签到码回查一次 checkin_codes（按活动和签到码的索引），
+    用于区分“已过期”和“无效”，并登记其他进程生成的签到码
+
+首次使用时从 checkin_codes 加载未过期的签到码。登记表只在当前进程内有效，
+多进程部署时某个进程结束签到后，其他进程中的签到码在过期前仍然有效
+"""
+import heapq
+import random
+import string
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, CheckInCode
+
+CODE_LENGTH = 6
+# 随机号码与有效签到码或其他进程的签到码冲突时的重试次数
+GENERATE_RETRIES = 20
+
+# 其他活动的过期签到码保留多久后才可以被复用
+EXPIRED_CODE_RETENTION = timedelta(days=1)
+
+VALID = 'valid'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+
+# 签到码 -> (活动ID, 过期时间)
+_codes = {}
+# 活动ID -> 该活动的签到码集合
+_codes_by_activity = {}
+# (过期时间, 签到码) 最小堆，移除的签到码在出堆时跳过
+_expiry_heap = []
+_loaded = False
+_lock = threading.Lock()
+
+
+def _add(code, activity_id, expires_at):
+    """登记签到码（调用方持有锁）"""
+    _codes[code] = (activity_id, expires_at)
+    _codes_by_activity.setdefault(activity_id, set()).add(code)
+    heapq.heappush(_expiry_heap, (expires_at, code))
+
+
+def _remove(code):
+    """移除签到码（调用方持有锁）"""
+    activity_id, _ = _codes.pop(code)
+    codes = _codes_by_activity.get(activity_id)
+    if codes:
+        codes.discard(code)
+        if not codes:
+            del _codes_by_activity[activity_id]
+
+
+def _purge(now):
+    """按过期时间弹出已过期的签到码（调用方持有锁）"""
+    while _expiry_heap and _expiry_heap[0][0] <= now:
+        expires_at, code = heapq.heappop(_expiry_heap)
+        entry = _codes.get(code)
+        if entry and entry[1] == expires_at:
+            _remove(code)
+
+
+def _ensure_loaded():
+    """首次使用时加载未过期的签到码"""
+    global _loaded
+    if _loaded:
+        return
+    now = datetime.utcnow()
+    rows = db.session.query(CheckInCode.code, CheckInCode.activity_id, CheckInCode.expires_at).filter(
+        CheckInCode.expires_at > now
+    ).all()
+    with _lock:
+        if not _loaded:
+            for code, activity_id, expires_at in rows:
+                _add(code, activity_id, expires_at)
+            _loaded = True
+
+
+def generate(activity_id, duration):
+    """
+    为活动生成签到码，写入 checkin_codes 并提交后登记
+
+    Args:
+        activity_id: 活动ID
+        duration: 有效期（分钟）
+
+    Returns:
+        CheckInCode: 生成的签到码（未加入会话），重试次数用尽时为None
+    """
+    _ensure_loaded()
+    now = datetime.utcnow()
+    expires_at = now + timedelta(minutes=duration)
+    table = CheckInCode.__table__
+
+    for _ in range(GENERATE_RETRIES):
+        code = ''.join(random.choices(string.digits, k=CODE_LENGTH))
+        with _lock:
+            _purge(now)
+            if code in _codes:
+                continue
+
+        # 号码被本活动的过期签到码或其他活动保留期已过的签到码占用时复用该行，
+        # 被有效签到码（包括其他进程的）或其他活动刚过期的签到码占用时不写入
+        stmt = sqlite_insert(table).values(activity_id=activity_id, code=code, expires_at=expires_at, created_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['code'],
+            set_={'activity_id': activity_id, 'expires_at': expires_at, 'created_at': now},
+            where=db.or_(
+                db.and_(table.c.activity_id == activity_id, table.c.expires_at <= now),
+                table.c.expires_at <= now - EXPIRED_CODE_RETENTION
+            )
+        ).returning(table.c.id)
+        checkin_code_id = db.session.execute(stmt).scalar()
+        if checkin_code_id is None:
+            db.session.rollback()
+            continue
+        db.session.commit()
+
+        with _lock:
+            _add(code, activity_id, expires_at)
+        return CheckInCode(id=checkin_code_id, activity_id=activity_id, code=code,
+                           expires_at=expires_at, created_at=now)
+    return None
+
+
+def validate(activity_id, code):
+    """
+    校验签到码
+
+    Returns:
+        str: VALID、INVALID（不存在或不属于该活动）或 EXPIRED
+    """
+    _ensure_loaded()
+    now = datetime.utcnow()
+    with _lock:
+        _purge(now)
+        entry = _codes.get(code)
+    if entry:
+        return VALID if entry[0] == activity_id else INVALID
+
+    row = db.session.query(CheckInCode.activity_id, CheckInCode.expires_at).filter_by(
+        activity_id=activity_id, code=code
+    ).first()
+    if row is None:
+        return INVALID
+    if row.expires_at <= now:
+        return EXPIRED
+    # 其他进程生成的签到码
+    with _lock:
+        if code not in _codes:
+            _add(code, row.activity_id, row.expires_at)
+    return VALID
+
+
+def evict_activity(activity_id):
+    """立即移除活动的所有签到码（结束签到时在提交之后调用）"""
+    with _lock:
+        for code in list(_codes_by_activity.get(activity_id, ())):
+            _remove(code)
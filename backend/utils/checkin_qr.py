@@ -0,0 +1,79 @@
+"""
+签到二维码签名
+
+二维码内容为 {"activityId", "window", "sig"} 的JSON：
+  - window 为当前时间按 CHECKIN_QR_ROTATION 秒划分的时间窗口编号，二维码每个窗口轮换一次
+  - sig 为以 CHECKIN_QR_SECRET 为密钥对 "活动ID:窗口编号" 计算的 HMAC-SHA256（截取前16字节）
+
+校验只做一次HMAC计算，不查询数据库，也不需要各进程、各节点共享签到码表，只要密钥一致且时钟同步。
+除当前窗口外还接受之前 CHECKIN_QR_GRACE_WINDOWS 个窗口的二维码，避免在轮换时刚扫描的学生失败；
+截图转发的二维码最多在这几个窗口内有效
+"""
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from flask import current_app
+
+VALID = 'valid'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+MALFORMED = 'malformed'
+
+SIGNATURE_BYTES = 16
+
+
+def _sign(activity_id, window):
+    secret = current_app.config['CHECKIN_QR_SECRET'].encode()
+    message = f'{activity_id}:{window}'.encode()
+    return hmac.new(secret, message, hashlib.sha256).digest()[:SIGNATURE_BYTES].hex()
+
+
+def _current_window():
+    return int(time.time()) // current_app.config['CHECKIN_QR_ROTATION']
+
+
+def generate(activity_id):
+    """
+    生成活动当前时间窗口的二维码内容
+
+    Returns:
+        tuple: (二维码内容, 本窗口结束时间)
+    """
+    rotation = current_app.config['CHECKIN_QR_ROTATION']
+    window = _current_window()
+    qr_data = json.dumps({'activityId': activity_id, 'window': window, 'sig': _sign(activity_id, window)},
+                         separators=(',', ':'))
+    return qr_data, datetime.utcfromtimestamp((window + 1) * rotation)
+
+
+def verify(activity_id, qr_data):
+    """
+    校验二维码内容
+
+    Args:
+        activity_id: 签到的活动ID
+        qr_data: 二维码内容（JSON字符串）
+
+    Returns:
+        str: VALID、INVALID（签名不符或不属于该活动）、EXPIRED 或 MALFORMED（格式错误）
+    """
+    try:
+        payload = json.loads(qr_data)
+        qr_activity_id = payload['activityId']
+        window = payload['window']
+        signature = payload['sig']
+    except (TypeError, ValueError, KeyError):
+        return MALFORMED
+    if not isinstance(window, int) or not isinstance(signature, str) or qr_activity_id != activity_id:
+        return INVALID
+    if not hmac.compare_digest(signature, _sign(activity_id, window)):
+        return INVALID
+
+    current = _current_window()
+    if window > current:
+        return INVALID
+    if window < current - current_app.config['CHECKIN_QR_GRACE_WINDOWS']:
+        return EXPIRED
+    return VALID
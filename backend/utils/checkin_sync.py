@@ -0,0 +1,166 @@
+"""
+离线签到批量同步
+
+网络不好的场地由组织者离线扫描学生，之后一次上传全部扫描记录 (学生ID, 扫描时间, 签到方式)：
+  - 同一学生的多条记录只保留最早的一条
+  - 报名记录和已有签到记录各用一条查询（json_each展开学生ID）批量核对
+  - 报名状态用一条 UPDATE ... FROM 批量更新为已签到，签到时间为扫描时间，
+    条件要求仍为registered，与在线签到并发时只有一方成功
+  - 签到记录用一条多行INSERT写入
+全部写入在同一个事务中提交，并返回与上传顺序一一对应的处理结果
+"""
+import json
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import bindparam, func, insert, select, update
+from models import db, CheckIn, Registration
+
+METHODS = ('qrcode', 'code')
+
+# 允许扫描设备的时钟比服务器快的时间
+CLOCK_SKEW = timedelta(minutes=5)
+
+# 逐条结果
+CHECKED_IN = 'checked_in'
+ALREADY_CHECKED_IN = 'already_checked_in'
+DUPLICATE = 'duplicate'
+NOT_REGISTERED = 'not_registered'
+INVALID = 'invalid'
+
+_registrations = Registration.__table__
+_sync_registration = _registrations.alias('sync_registration')
+_sync_records = func.json_each(bindparam('b_records')).table_valued('value').alias('sync_records')
+
+# b_records为 [[学生ID, 扫描时间], ...] 的JSON。逐条记录用关联子查询按 (activity_id, user_id) 索引定位报名记录，
+# 保证由扫描记录驱动查找，而不是对每条报名记录扫描一遍JSON
+_sync = select(
+    select(_sync_registration.c.id).where(
+        _sync_registration.c.activity_id == bindparam('b_activity_id'),
+        _sync_registration.c.user_id == func.json_extract(_sync_records.c.value, '$[0]')
+    ).scalar_subquery().label('registration_id'),
+    func.json_extract(_sync_records.c.value, '$[1]').label('checked_in_at')
+).select_from(_sync_records).subquery('sync')
+
+SYNC_UPDATE = update(_registrations).where(
+    _registrations.c.id == _sync.c.registration_id,
+    _registrations.c.status == 'registered'
+).values(status='checked_in', checked_in_at=_sync.c.checked_in_at).returning(_registrations.c.user_id)
+
+
+class CheckInSyncError(Exception):
+    """上传内容无法解析"""
+
+
+def _parse_time(value):
+    """解析ISO格式的扫描时间，转换为不带时区的UTC时间"""
+    scanned_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if scanned_at.tzinfo:
+        scanned_at = scanned_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return scanned_at
+
+
+def parse_records(data, max_records):
+    """
+    解析上传的扫描记录
+
+    Returns:
+        list: 与上传顺序对应的 (学生ID, 扫描时间, 签到方式)，格式错误的记录为None
+
+    Raises:
+        CheckInSyncError: records缺失、为空或超过数量上限
+    """
+    records = data.get('records') if isinstance(data, dict) else None
+    if not isinstance(records, list) or not records:
+        raise CheckInSyncError('缺少扫描记录')
+    if len(records) > max_records:
+        raise CheckInSyncError(f'单次最多上传 {max_records} 条扫描记录')
+
+    latest = datetime.utcnow() + CLOCK_SKEW
+    parsed = []
+    for record in records:
+        try:
+            user_id = record['userId']
+            scanned_at = _parse_time(record['scannedAt'])
+            method = record['method']
+        except (TypeError, KeyError, AttributeError, ValueError):
+            parsed.append(None)
+            continue
+        if not isinstance(user_id, int) or isinstance(user_id, bool) or method not in METHODS or scanned_at > latest:
+            parsed.append(None)
+        else:
+            parsed.append((user_id, scanned_at, method))
+    return parsed
+
+
+def sync_checkins(activity_id, records):
+    """
+    将离线扫描记录批量写入签到（不提交事务）
+
+    Args:
+        activity_id: 活动ID
+        records: parse_records的返回值
+
+    Returns:
+        dict: 汇总和与上传顺序一一对应的结果
+    """
+    results = [INVALID if record is None else None for record in records]
+
+    # 同一学生只保留最早的扫描记录
+    earliest = {}
+    for index, record in enumerate(records):
+        if record is not None and (record[0] not in earliest or record[1] < records[earliest[record[0]]][1]):
+            earliest[record[0]] = index
+    for index, record in enumerate(records):
+        if record is not None and earliest[record[0]] != index:
+            results[index] = DUPLICATE
+
+    # 批量核对报名记录和已有签到记录
+    user_ids = json.dumps(list(earliest))
+    requested = select(func.json_each(bindparam('b_user_ids')).table_valued('value').c.value)
+    statuses = dict(db.session.execute(
+        select(Registration.user_id, Registration.status).where(
+            Registration.activity_id == activity_id, Registration.user_id.in_(requested)
+        ), {'b_user_ids': user_ids}
+    ).all())
+    checked_in = set(db.session.execute(
+        select(CheckIn.user_id).where(CheckIn.activity_id == activity_id, CheckIn.user_id.in_(requested)),
+        {'b_user_ids': user_ids}
+    ).scalars())
+
+    pending = []
+    for user_id, index in earliest.items():
+        status = statuses.get(user_id)
+        if status == 'checked_in' or user_id in checked_in:
+            results[index] = ALREADY_CHECKED_IN
+        elif status != 'registered':
+            results[index] = NOT_REGISTERED
+        else:
+            pending.append(index)
+
+    # 一条UPDATE更新报名状态，只为更新成功的学生写入签到记录
+    updated = set()
+    if pending:
+        updated = set(db.session.execute(SYNC_UPDATE, {
+            'b_activity_id': activity_id,
+            'b_records': json.dumps([[records[index][0], records[index][1].strftime('%Y-%m-%d %H:%M:%S.%f')]
+                                     for index in pending])
+        }).scalars())
+    inserts = []
+    for index in pending:
+        user_id, scanned_at, method = records[index]
+        if user_id in updated:
+            results[index] = CHECKED_IN
+            inserts.append({'activity_id': activity_id, 'user_id': user_id, 'method': method,
+                            'checked_in_at': scanned_at})
+        else:
+            # 核对之后被在线签到抢先
+            results[index] = ALREADY_CHECKED_IN
+    if inserts:
+        db.session.execute(insert(CheckIn.__table__), inserts)
+
+    return {
+        'total': len(records),
+        'checkedIn': results.count(CHECKED_IN),
+        'skipped': results.count(ALREADY_CHECKED_IN) + results.count(DUPLICATE),
+        'failed': results.count(NOT_REGISTERED) + results.count(INVALID),
+        'results': results
+    }
@@ -0,0 +1,99 @@
+"""
+签到批量提交（group commit）
+
+SQLite每次提交都要在全局写锁下同步写盘，签到高峰时每个签到单独提交，吞吐受限于磁盘同步次数。
+CHECKIN_GROUP_COMMIT_SIZE大于0时，签到凭证校验通过的请求不再单独提交，而是放入进程内队列：
+单个后台线程每攒够 CHECKIN_GROUP_COMMIT_SIZE 条、或第一条等待超过 CHECKIN_GROUP_COMMIT_DELAY_MS 毫秒，
+就在一个事务中执行这一批签到并提交一次。请求线程一直等到所在批次提交完成才返回，
+返回签到成功时签到记录已经写入磁盘。
+
+批次提交失败时整批返回失败，客户端可以重试；等待超时（CHECKIN_GROUP_COMMIT_TIMEOUT秒）时
+批次可能仍会提交，重试会得到“已经签到过了”。队列只在当前进程内，多进程部署时各进程分别批量提交
+"""
+import queue
+import threading
+import time
+from flask import current_app
+from models import db, CheckIn
+
+
+class CheckInWriterError(Exception):
+    """批次提交失败或等待超时"""
+
+
+class _Pending:
+    """等待批量提交的签到"""
+    __slots__ = ('entry', 'result', 'error', 'done')
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.result = None
+        self.error = False
+        self.done = threading.Event()
+
+
+_queue = queue.Queue()
+_lock = threading.Lock()
+_worker = None
+
+
+def enabled():
+    return current_app.config.get('CHECKIN_GROUP_COMMIT_SIZE', 0) > 0
+
+
+def submit(activity_id, user_id, password_version, method):
+    """
+    提交签到并等待所在批次提交完成
+
+    Returns:
+        tuple: (签到记录ID, 签到时间)，校验不通过时为None
+
+    Raises:
+        CheckInWriterError: 批次提交失败或等待超时
+    """
+    _ensure_worker(current_app._get_current_object())
+    pending = _Pending((activity_id, user_id, password_version, method))
+    _queue.put(pending)
+    if not pending.done.wait(current_app.config['CHECKIN_GROUP_COMMIT_TIMEOUT']) or pending.error:
+        raise CheckInWriterError()
+    return pending.result
+
+
+def _ensure_worker(app):
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, args=(app,), name='checkin-writer', daemon=True)
+            _worker.start()
+
+
+def _run(app):
+    batch_size = app.config['CHECKIN_GROUP_COMMIT_SIZE']
+    max_delay = app.config['CHECKIN_GROUP_COMMIT_DELAY_MS'] / 1000
+    while True:
+        batch = [_queue.get()]
+        deadline = time.monotonic() + max_delay
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(_queue.get(timeout=remaining) if remaining > 0 else _queue.get_nowait())
+            except queue.Empty:
+                break
+
+        with app.app_context():
+            try:
+                results = CheckIn.record_many([pending.entry for pending in batch])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[checkin-writer] 批量签到失败: {e}")
+                results = None
+            finally:
+                db.session.remove()
+
+        for index, pending in enumerate(batch):
+            if results is None:
+                pending.error = True
+            else:
+                pending.result = results[index]
+            pending.done.set()
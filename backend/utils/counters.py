@@ -0,0 +1,130 @@
+"""
+报名计数器维护工具
+"""
+from sqlalchemy import func, select, update
+from models import db, Activity, ActivitySubItem, Registration
+from utils import response_cache
+
+# 每个事务修正的活动数，缩短持有写锁的时间
+RECONCILE_BATCH_SIZE = 200
+
+
+def rebuild_sub_item_counters():
+    """
+    根据报名记录一次性重建所有子项目计数器
+    
+    使用一次分组统计查询得到各子项目的实际报名人数，
+    修正有偏差的计数器和人数上限，补建缺失的计数器，删除已不存在的子项目的计数器，
+    并递增受影响活动的计数器版本号
+    
+    Returns:
+        dict: {'created': 新建数, 'updated': 修正数, 'deleted': 删除数}
+    """
+    counts = {
+        (activity_id, sub_item): count
+        for activity_id, sub_item, count in db.session.query(
+            Registration.activity_id,
+            Registration.sub_item,
+            func.count(Registration.id)
+        ).filter(
+            Registration.status != 'cancelled',
+            Registration.sub_item.isnot(None)
+        ).group_by(Registration.activity_id, Registration.sub_item).all()
+    }
+    
+    expected = {}
+    limits = {}
+    for activity_id, sub_items in db.session.query(Activity.id, Activity.sub_items).filter(
+        Activity.sub_items.isnot(None)
+    ).all():
+        for name, limit in Activity.sub_item_limits(sub_items).items():
+            expected[(activity_id, name)] = counts.get((activity_id, name), 0)
+            limits[(activity_id, name)] = limit
+    
+    result = {'created': 0, 'updated': 0, 'deleted': 0}
+    changed = set()
+    for counter in ActivitySubItem.query.all():
+        key = (counter.activity_id, counter.name)
+        if key not in expected:
+            db.session.delete(counter)
+            changed.add(counter.activity_id)
+            result['deleted'] += 1
+            continue
+        count = expected.pop(key)
+        if counter.current_participants != count or counter.max_participants != limits[key]:
+            counter.current_participants = count
+            counter.max_participants = limits[key]
+            changed.add(counter.activity_id)
+            result['updated'] += 1
+    
+    for (activity_id, name), count in expected.items():
+        db.session.add(ActivitySubItem(activity_id=activity_id, name=name, current_participants=count,
+                                       max_participants=limits[(activity_id, name)]))
+        changed.add(activity_id)
+        result['created'] += 1
+    
+    ActivitySubItem.bump_version(changed)
+    db.session.commit()
+    return result
+
+
+def _active_count(activity_id_column):
+    """指定活动的有效报名数的关联子查询，使用 (activity_id, status) 索引"""
+    return select(func.count(Registration.id)).where(
+        Registration.activity_id == activity_id_column,
+        Registration.status != 'cancelled'
+    ).scalar_subquery()
+
+
+def reconcile_participant_counters(batch_size=RECONCILE_BATCH_SIZE):
+    """
+    根据报名记录修正活动的当前参与人数，可在服务运行时执行
+    
+    先用一次分组统计查询找出计数有偏差的活动，再按批次更新，每批一个短事务。
+    更新语句中重新统计报名数并比较，报名和取消报名在同一事务中修改报名记录和计数，
+    因此在持有写锁时统计到的值与计数一致，不会覆盖并发报名的结果；
+    查询之后已经被并发请求修正的活动不会被更新
+    
+    Args:
+        batch_size: 每个事务修正的活动数
+    
+    Returns:
+        dict: {'checked': 检查的活动数, 'drifted': 统计时有偏差的活动数,
+               'updated': 实际修正的活动数, 'activityIds': 修正的活动ID}
+    """
+    counts = select(
+        Registration.activity_id,
+        func.count(Registration.id).label('actual')
+    ).where(
+        Registration.status != 'cancelled'
+    ).group_by(Registration.activity_id).subquery()
+    
+    rows = db.session.execute(
+        select(Activity.id, Activity.current_participants, func.coalesce(counts.c.actual, 0))
+        .outerjoin(counts, counts.c.activity_id == Activity.id)
+    ).all()
+    db.session.commit()
+    drifted = [activity_id for activity_id, current, actual in rows if current != actual]
+    
+    updated = []
+    for start in range(0, len(drifted), batch_size):
+        actual = _active_count(Activity.id)
+        updated.extend(activity_id for (activity_id,) in db.session.execute(
+            update(Activity)
+            .where(Activity.id.in_(drifted[start:start + batch_size]), Activity.current_participants != actual)
+            .values(current_participants=actual)
+            .returning(Activity.id)
+        ))
+        db.session.commit()
+    
+    return {'checked': len(rows), 'drifted': len(drifted), 'updated': len(updated), 'activityIds': updated}
+
+
+def reconcile_participant_counters_job():
+    """定时任务：修正参与人数并使相应活动的缓存失效，有偏差时输出日志"""
+    result = reconcile_participant_counters()
+    for activity_id in result['activityIds']:
+        response_cache.invalidate_activity(activity_id)
+    if result['drifted']:
+        print(f"[counter-reconcile] 检查 {result['checked']} 个活动，"
+              f"{result['drifted']} 个参与人数有偏差，已修正 {result['updated']} 个")
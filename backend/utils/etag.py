@@ -0,0 +1,48 @@
+"""
+活动接口的ETag（条件请求）支持
+
+ETag由活动的更新时间、参与人数、子项目计数器版本号和按当前时间计算出的状态生成，
+这些字段都在activities表的同一行中。客户端携带匹配的If-None-Match时直接返回304，
+不需要序列化，也不需要查询组织者、子项目计数器等关联表
+"""
+import hashlib
+from flask import request, current_app
+from models import Activity
+
+
+def activity_etag(activities, *extra):
+    """
+    根据活动行计算强ETag
+
+    Args:
+        activities: Activity对象或包含同名字段的行
+        extra: 其他影响响应内容的值（如列表总数）
+
+    Returns:
+        str: 不带引号的ETag值
+    """
+    digest = hashlib.sha1()
+    for activity in activities:
+        status = Activity.resolve_status(activity.status, activity.start_time, activity.end_time)
+        digest.update(
+            f'{activity.id}:{activity.updated_at.isoformat()}:{activity.current_participants}:'
+            f'{activity.counters_version}:{status};'.encode()
+        )
+    for value in extra:
+        digest.update(f'{value};'.encode())
+    return digest.hexdigest()
+
+
+def not_modified(etag):
+    """客户端缓存仍然有效时返回304响应，否则返回None"""
+    if not request.if_none_match.contains(etag):
+        return None
+    response = current_app.response_class(status=304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    """为响应设置ETag，并要求客户端每次使用前重新验证"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
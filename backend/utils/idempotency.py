@@ -0,0 +1,108 @@
+"""
+幂等键
+
+移动端在网络不稳定时会重试报名、签到请求。请求带有 Idempotency-Key 请求头时，
+按 (登录身份, 路径, 幂等键) 在进程内保存第一次请求的响应，有效期内的重试直接返回保存的响应
+（带 Idempotent-Replayed: true 响应头），不再查询用户和业务表。
+
+  - 同一个幂等键的第一次请求仍在处理时，重试返回409
+  - 同一个幂等键用于不同的请求体时返回422
+  - 5xx响应不保存，客户端可以用同一个幂等键重试
+
+所有条目的有效期相同，按写入顺序保存即按过期时间排序，清理过期条目只需检查队首。
+保存的内容只在当前进程内有效，多进程部署时各进程分别保存
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, jsonify
+from flask_jwt_extended import get_jwt_identity
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# (登录身份, 路径, 幂等键) -> [过期时间, 请求体摘要, 状态码, 响应体, mimetype]，状态码为None表示处理中
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+
+def _purge(now):
+    """删除队首的过期条目（调用方持有锁）"""
+    while _entries:
+        key, entry = next(iter(_entries.items()))
+        if entry[0] > now:
+            break
+        del _entries[key]
+
+
+def idempotent(f):
+    """
+    装饰器：支持 Idempotency-Key 请求头
+
+    放在@jwt_required()之后、@require_active_user之前，重放时只校验JWT，不查询数据库
+
+    用法：
+    @bp.route('/some-route', methods=['POST'])
+    @jwt_required()
+    @idempotent
+    @require_active_user
+    def some_route():
+        ...
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        config = current_app.config
+        if not key or config.get('IDEMPOTENCY_STORE_SIZE', 0) <= 0:
+            return f(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'code': 400, 'message': f'{HEADER} 不能超过 {MAX_KEY_LENGTH} 个字符'}), 400
+
+        store_key = (get_jwt_identity(), request.path, key)
+        digest = hashlib.sha1(request.get_data()).digest()
+        now = time.monotonic()
+
+        with _lock:
+            _purge(now)
+            entry = _entries.get(store_key)
+            if entry is None:
+                _entries[store_key] = [now + config['IDEMPOTENCY_KEY_TTL'], digest, None, None, None]
+                while len(_entries) > config['IDEMPOTENCY_STORE_SIZE']:
+                    _entries.popitem(last=False)
+            elif entry[1] != digest:
+                return jsonify({'code': 422, 'message': f'{HEADER} 已用于不同的请求'}), 422
+            elif entry[2] is None:
+                return jsonify({'code': 409, 'message': '相同的请求正在处理中，请稍后重试'}), 409
+            else:
+                _, _, status, body, mimetype = entry
+
+        if entry is not None:
+            response = current_app.response_class(body, status=status, mimetype=mimetype)
+            response.headers[REPLAYED_HEADER] = 'true'
+            return response
+
+        try:
+            response = current_app.make_response(f(*args, **kwargs))
+        except Exception:
+            with _lock:
+                _entries.pop(store_key, None)
+            raise
+
+        with _lock:
+            entry = _entries.get(store_key)
+            if response.status_code >= 500:
+                _entries.pop(store_key, None)
+            elif entry is not None:
+                entry[2:] = [response.status_code, response.get_data(), response.mimetype]
+        return response
+
+    return decorated_function
+
+
+def clear():
+    """清空保存的响应"""
+    with _lock:
+        _entries.clear()
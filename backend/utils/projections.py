@@ -0,0 +1,172 @@
+"""
+只读列投影查询
+
+列表接口只需要把记录转换为字典。这里只查询序列化所需的列，返回轻量的Row元组，
+不创建ORM实体，也没有身份映射和变更跟踪的开销。
+各模型的to_dict_list按属性名读取字段，可以直接接收这里返回的行
+"""
+import base64
+import json
+from datetime import datetime
+from math import ceil
+from sqlalchemy import select, func, tuple_
+from models import db, User, Activity, Registration, CheckIn
+
+ACTIVITY_COLUMNS = (
+    Activity.id, Activity.title, Activity.description, Activity.category, Activity.status,
+    Activity.organizer_id, Activity.start_time, Activity.end_time, Activity.location,
+    Activity.max_participants, Activity.current_participants, Activity.registration_deadline,
+    Activity.cover_image, Activity.images, Activity.tags, Activity.sub_items,
+    Activity.counters_version, Activity.admission_mode, Activity.created_at, Activity.updated_at
+)
+
+ACTIVITY_SUMMARY_COLUMNS = (
+    Activity.id, Activity.title, Activity.category, Activity.status,
+    Activity.start_time, Activity.end_time, Activity.location, Activity.cover_image
+)
+
+REGISTRATION_COLUMNS = (
+    Registration.id, Registration.activity_id, Registration.user_id, Registration.status,
+    Registration.sub_item, Registration.registered_at, Registration.checked_in_at
+)
+
+CHECKIN_COLUMNS = (
+    CheckIn.id, CheckIn.activity_id, CheckIn.user_id, CheckIn.method, CheckIn.checked_in_at
+)
+
+USER_IDENTITY_COLUMNS = (User.id, User.username, User.email, User.role)
+
+
+class RowPagination:
+    """分页结果，属性与Flask-SQLAlchemy的Pagination一致"""
+    __slots__ = ('items', 'total', 'page', 'per_page', 'pages')
+
+    def __init__(self, items, total, page, per_page):
+        self.items = items
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+        self.pages = ceil(total / per_page) if total else 0
+
+
+class KeysetPage:
+    """键集分页结果，next_cursor为None表示没有下一页"""
+    __slots__ = ('items', 'next_cursor', 'per_page')
+
+    def __init__(self, items, next_cursor, per_page):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+
+
+def select_activities():
+    return select(*ACTIVITY_COLUMNS)
+
+
+def select_registrations():
+    return select(*REGISTRATION_COLUMNS)
+
+
+def select_checkins():
+    return select(*CHECKIN_COLUMNS)
+
+
+def paginate_rows(stmt, page, per_page, max_per_page=100):
+    """
+    对列投影查询分页，参数处理与db.paginate(error_out=False)一致
+
+    Args:
+        stmt: 已包含筛选和排序条件的select语句
+        page: 页码
+        per_page: 每页数量
+        max_per_page: 每页数量上限
+
+    Returns:
+        RowPagination: 分页结果
+    """
+    per_page = min(per_page, max_per_page) if max_per_page else per_page
+    if page < 1:
+        page = 1
+    if per_page < 1:
+        per_page = 20
+
+    items = db.session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).all()
+    total = db.session.execute(
+        select(func.count()).select_from(stmt.order_by(None).subquery())
+    ).scalar()
+    return RowPagination(items, total, page, per_page)
+
+
+def encode_cursor(time_value, row_id):
+    """把 (时间, ID) 编码为不透明的分页游标"""
+    raw = json.dumps([time_value.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    解析encode_cursor生成的游标
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    try:
+        time_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(time_value), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('invalid cursor') from e
+
+
+def paginate_keyset(stmt, time_column, id_column, cursor, per_page, max_per_page=100):
+    """
+    按 (时间列, ID列) 倒序的键集分页，不使用OFFSET，也不统计总数
+
+    每一页都是从游标位置开始的索引范围扫描，耗时与页码无关
+
+    Args:
+        stmt: 已包含筛选条件的select语句（不含排序），需选出time_column和id_column
+        time_column: 排序的时间列
+        id_column: 时间相同时用于排序的ID列
+        cursor: 上一页返回的next_cursor，第一页为空
+        per_page: 每页数量
+        max_per_page: 每页数量上限
+
+    Returns:
+        KeysetPage: 分页结果
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    per_page = min(per_page, max_per_page) if max_per_page else per_page
+    if per_page < 1:
+        per_page = 20
+
+    if cursor:
+        stmt = stmt.where(tuple_(time_column, id_column) < tuple_(*decode_cursor(cursor)))
+    rows = db.session.execute(
+        stmt.order_by(time_column.desc(), id_column.desc()).limit(per_page + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_column.key), getattr(last, id_column.key))
+    return KeysetPage(rows, next_cursor, per_page)
+
+
+def load_user_identities(user_ids):
+    """按ID批量查询用户的身份字段（id、username、email、role）"""
+    if not user_ids:
+        return []
+    return db.session.execute(
+        select(*USER_IDENTITY_COLUMNS).where(User.id.in_(user_ids))
+    ).all()
+
+
+def load_activities(activity_ids, summary=False):
+    """按ID批量查询活动，summary为True时只查询摘要所需的列"""
+    if not activity_ids:
+        return []
+    columns = ACTIVITY_SUMMARY_COLUMNS if summary else ACTIVITY_COLUMNS
+    return db.session.execute(select(*columns).where(Activity.id.in_(activity_ids))).all()
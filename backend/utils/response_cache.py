@@ -0,0 +1,185 @@
+"""
+公开活动目录的响应缓存
+
+GET /api/activities 和 GET /api/activities/<id> 不需要登录，所有学生看到的内容相同。
+这里在进程内按规范化的查询参数缓存序列化后的响应体和ETag，按LRU淘汰。
+
+失效规则（均在事务提交之后调用）：
+  - 创建、修改、删除活动：invalidate_activity(activity_id, lists=True)，
+    清除该活动的详情和所有列表（筛选结果和总数都可能变化）
+  - 报名人数变化：invalidate_activity(activity_id)，
+    只清除该活动的详情和包含该活动的列表页
+活动状态由当前时间计算，缓存项在其中活动的下一个状态切换时间点自动过期。
+
+缓存只在当前进程内有效，多进程部署时各进程分别缓存和失效
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func
+from models import db, Activity
+from utils.etag import not_modified, with_etag
+
+# 缓存键 -> (响应体, ETag, 包含的活动ID, 过期时间)
+_cache = OrderedDict()
+# 活动ID -> 包含该活动的列表缓存键
+_list_keys_by_activity = {}
+# 每次失效时递增，用于丢弃失效之前开始构建的响应
+_generation = 0
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+_lock = threading.Lock()
+
+
+def _capacity():
+    return current_app.config.get('ACTIVITY_CACHE_SIZE', 0)
+
+
+def detail_key(activity_id):
+    return ('detail', activity_id)
+
+
+def list_key(**params):
+    """列表缓存键，params为解析后的查询参数，空值视为未提供"""
+    return ('list',) + tuple(sorted((name, value) for name, value in params.items() if value not in (None, '')))
+
+
+def _drop(key):
+    """移除缓存项及其反向索引（调用方持有锁）"""
+    entry = _cache.pop(key, None)
+    if entry and key[0] == 'list':
+        for activity_id in entry[2]:
+            keys = _list_keys_by_activity.get(activity_id)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del _list_keys_by_activity[activity_id]
+
+
+def lookup(key):
+    """
+    查找缓存的响应
+
+    Returns:
+        tuple: (Response或None, 构建代数)。未命中时按返回的代数调用store
+    """
+    if _capacity() <= 0:
+        return None, None
+
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry[3] is not None and datetime.utcnow() >= entry[3]:
+            _drop(key)
+            entry = None
+        if entry is None:
+            _stats['misses'] += 1
+            return None, _generation
+        _cache.move_to_end(key)
+        _stats['hits'] += 1
+
+    body, etag = entry[0], entry[1]
+    cached = not_modified(etag)
+    if cached:
+        return cached, None
+    return with_etag(current_app.response_class(body, mimetype='application/json'), etag), None
+
+
+def store(key, generation, response, etag, activities, expires_at=None):
+    """
+    缓存响应；构建期间发生过失效时不缓存
+
+    Args:
+        key: 缓存键
+        generation: lookup返回的构建代数
+        response: 200响应
+        etag: 响应的ETag
+        activities: 响应中包含的活动行
+        expires_at: 过期时间，默认为其中活动的下一个状态切换时间
+    """
+    capacity = _capacity()
+    if generation is None or capacity <= 0:
+        return
+    activity_ids = frozenset(activity.id for activity in activities)
+    if expires_at is None:
+        expires_at = next_status_change(activities)
+
+    with _lock:
+        if generation != _generation:
+            return
+        _drop(key)
+        _cache[key] = (response.get_data(), etag, activity_ids, expires_at)
+        if key[0] == 'list':
+            for activity_id in activity_ids:
+                _list_keys_by_activity.setdefault(activity_id, set()).add(key)
+        while len(_cache) > capacity:
+            _drop(next(iter(_cache)))
+            _stats['evictions'] += 1
+
+
+def next_status_change(activities, now=None):
+    """返回给定活动中最早的下一个状态切换时间，没有时返回None"""
+    now = now or datetime.utcnow()
+    changes = []
+    for activity in activities:
+        if activity.status == 'cancelled':
+            continue
+        if activity.start_time > now:
+            changes.append(activity.start_time)
+        elif activity.end_time >= now:
+            changes.append(activity.end_time)
+    return min(changes) if changes else None
+
+
+def next_global_status_change(now=None):
+    """
+    返回所有活动中最早的下一个状态切换时间
+
+    按状态筛选的列表在任一活动切换状态时都可能变化，使用开始/结束时间上的索引查询
+    """
+    now = now or datetime.utcnow()
+    next_start = db.session.query(func.min(Activity.start_time)).filter(Activity.start_time > now).scalar()
+    next_end = db.session.query(func.min(Activity.end_time)).filter(Activity.end_time >= now).scalar()
+    changes = [value for value in (next_start, next_end) if value is not None]
+    return min(changes) if changes else None
+
+
+def invalidate_activity(activity_id, lists=False):
+    """
+    使活动相关的缓存失效
+
+    Args:
+        activity_id: 活动ID
+        lists: 为True时清除所有列表缓存（活动被创建、修改或删除），
+            否则只清除包含该活动的列表页（报名人数变化）
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+        _stats['invalidations'] += 1
+        _drop(detail_key(activity_id))
+        if lists:
+            keys = [key for key in _cache if key[0] == 'list']
+        else:
+            keys = list(_list_keys_by_activity.get(activity_id, ()))
+        for key in keys:
+            _drop(key)
+
+
+def clear():
+    """清空缓存"""
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache.clear()
+        _list_keys_by_activity.clear()
+
+
+def get_stats():
+    """返回缓存命中统计"""
+    with _lock:
+        stats = dict(_stats)
+        stats['size'] = len(_cache)
+    stats['capacity'] = _capacity()
+    lookups = stats['hits'] + stats['misses']
+    stats['hitRate'] = round(stats['hits'] / lookups, 4) if lookups else 0
+    return stats
@@ -0,0 +1,285 @@
+"""
+报名名单批量导入
+
+组织者上传CSV或XLSX名单（学号、可选的子项目），一次导入整个班级：
+  - XLSX使用openpyxl只读模式逐行读取，CSV逐行解析
+  - 学生账号、已有报名记录都按批次用IN查询一次性解析
+  - 报名记录用一条 INSERT ... ON CONFLICT DO UPDATE 批量写入
+  - 活动人数用一条条件UPDATE一次占用，子项目名额每个子项目用一条条件UPDATE占用
+全部写入在同一个事务中提交，并返回逐行的处理结果
+"""
+import csv
+import io
+from datetime import datetime
+from openpyxl import load_workbook
+from sqlalchemy import bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, User, Activity, ActivitySubItem, Registration, WaitlistEntry
+
+# 表头别名（小写）
+ACCOUNT_HEADERS = {'学号', '账号', 'account', 'accountid', 'username'}
+SUB_ITEM_HEADERS = {'子项目', 'subitem', 'sub_item'}
+
+# IN查询每批的参数数量，避免超过SQLite的变量数限制
+CHUNK_SIZE = 500
+
+# 占用名额时并发报名导致条件不满足的重试次数
+RESERVE_RETRIES = 5
+
+REGISTERED = 'registered'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+class RosterError(Exception):
+    """名单文件无法解析"""
+
+
+def _cell_text(value):
+    """单元格转为字符串，Excel中以数字保存的学号去掉小数部分"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _iter_rows(file_storage):
+    """逐行读取上传的名单文件，产出单元格值的元组"""
+    filename = (file_storage.filename or '').lower()
+    if filename.endswith('.xlsx'):
+        try:
+            workbook = load_workbook(file_storage.stream, read_only=True, data_only=True)
+        except Exception:
+            raise RosterError('无法读取Excel文件')
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    elif filename.endswith('.csv'):
+        stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+        try:
+            yield from csv.reader(stream)
+        except UnicodeDecodeError:
+            raise RosterError('CSV文件需使用UTF-8编码')
+        finally:
+            stream.detach()
+    else:
+        raise RosterError('仅支持CSV或XLSX文件')
+
+
+def parse_roster(file_storage, max_rows):
+    """
+    解析名单文件
+
+    第一行包含“学号”等表头时按表头定位列，否则第一列为学号、第二列为子项目
+
+    Returns:
+        list: [(行号, 学号, 子项目或None)]，跳过空行
+
+    Raises:
+        RosterError: 文件格式不支持、无法解析或超过行数上限
+    """
+    rows = []
+    account_col, sub_item_col = 0, 1
+    for row_number, values in enumerate(_iter_rows(file_storage), start=1):
+        cells = [_cell_text(value) for value in values or ()]
+        if row_number == 1:
+            headers = [cell.lower() for cell in cells]
+            account_cols = [i for i, header in enumerate(headers) if header in ACCOUNT_HEADERS]
+            if account_cols:
+                account_col = account_cols[0]
+                sub_item_cols = [i for i, header in enumerate(headers) if header in SUB_ITEM_HEADERS]
+                sub_item_col = sub_item_cols[0] if sub_item_cols else None
+                continue
+        if not any(cells):
+            continue
+        if len(rows) >= max_rows:
+            raise RosterError(f'名单不能超过 {max_rows} 行')
+        account = cells[account_col] if account_col < len(cells) else ''
+        sub_item = cells[sub_item_col] if sub_item_col is not None and sub_item_col < len(cells) else ''
+        rows.append((row_number, account, sub_item or None))
+    return rows
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+def _resolve_students(accounts):
+    """
+    按学号批量查找学生用户ID
+
+    只匹配已有的学生账号，不创建账号；尚未登录过系统的学生由调用方报告为“学生不存在”
+
+    Returns:
+        dict: {学号: 用户ID}
+    """
+    student_ids = {}
+    for chunk in _chunks(accounts):
+        student_ids.update(db.session.query(User.username, User.id).filter(
+            User.username.in_(chunk), User.role == 'student', User.is_deleted == False
+        ).all())
+    return student_ids
+
+
+def _reserve_seats(activity_id, wanted):
+    """在剩余名额内尽量占用wanted个名额，返回实际占用数"""
+    for _ in range(RESERVE_RETRIES):
+        current, maximum = db.session.query(
+            Activity.current_participants, Activity.max_participants
+        ).filter(Activity.id == activity_id).one()
+        count = min(wanted, max(maximum - current, 0))
+        if count == 0 or Activity.reserve_seat(activity_id, count):
+            return count
+    return 0
+
+
+def _reserve_sub_item_seats(activity_id, name, wanted):
+    """在子项目剩余名额内尽量占用wanted个名额，返回实际占用数"""
+    for _ in range(RESERVE_RETRIES):
+        counter = db.session.query(
+            ActivitySubItem.current_participants, ActivitySubItem.max_participants
+        ).filter_by(activity_id=activity_id, name=name).first()
+        if counter is None:
+            return 0
+        current, maximum = counter
+        count = wanted if maximum is None else min(wanted, max(maximum - current, 0))
+        if count == 0 or ActivitySubItem.reserve(activity_id, name, count):
+            return count
+    return 0
+
+
+def _release_sub_item_seats(activity_id, rows):
+    """按子项目释放rows占用的子项目名额"""
+    released = {}
+    for _, _, sub_item in rows:
+        if sub_item:
+            released[sub_item] = released.get(sub_item, 0) + 1
+    for name, count in released.items():
+        ActivitySubItem.adjust(activity_id, name, -count)
+
+
+def import_roster(activity, rows):
+    """
+    将名单中的学生批量报名到活动（不提交事务）
+
+    Args:
+        activity: Activity对象
+        rows: parse_roster的返回值
+
+    Returns:
+        dict: 汇总和逐行结果
+    """
+    results = {}
+    sub_item_names = set(activity.sub_item_names())
+
+    # 行内校验
+    candidates = []
+    seen = set()
+    for row_number, account, sub_item in rows:
+        if not account:
+            results[row_number] = (FAILED, '学号为空')
+        elif account in seen:
+            results[row_number] = (SKIPPED, '名单中重复')
+        elif sub_item and sub_item not in sub_item_names:
+            results[row_number] = (FAILED, '子项目不存在')
+        else:
+            seen.add(account)
+            candidates.append((row_number, account, sub_item))
+
+    # 批量解析学生和已有报名
+    student_ids = _resolve_students([account for _, account, _ in candidates])
+    active = set()
+    for chunk in _chunks(student_ids.values()):
+        active.update(user_id for (user_id,) in db.session.query(Registration.user_id).filter(
+            Registration.activity_id == activity.id,
+            Registration.user_id.in_(chunk),
+            Registration.status != 'cancelled'
+        ).all())
+
+    pending = []
+    for row_number, account, sub_item in candidates:
+        user_id = student_ids.get(account)
+        if user_id is None:
+            results[row_number] = (FAILED, '学生不存在')
+        elif user_id in active:
+            results[row_number] = (SKIPPED, '已经报名过该活动')
+        else:
+            pending.append((row_number, user_id, sub_item))
+
+    # 每个子项目一次占用名额，超出子项目名额的行按名单顺序标记为失败
+    wanted = {}
+    for _, _, sub_item in pending:
+        if sub_item:
+            wanted[sub_item] = wanted.get(sub_item, 0) + 1
+    sub_item_reserved = {name: _reserve_sub_item_seats(activity.id, name, count) for name, count in wanted.items()}
+    accepted = []
+    for row in pending:
+        sub_item = row[2]
+        if sub_item and sub_item_reserved[sub_item] == 0:
+            results[row[0]] = (FAILED, Registration.ERROR_SUB_ITEM_FULL)
+            continue
+        if sub_item:
+            sub_item_reserved[sub_item] -= 1
+        accepted.append(row)
+    pending = accepted
+    
+    # 一次占用活动名额，超出名额的行按名单顺序标记为失败，并释放其子项目名额
+    reserved = _reserve_seats(activity.id, len(pending))
+    for row_number, _, _ in pending[reserved:]:
+        results[row_number] = (FAILED, Registration.ERROR_FULL)
+    _release_sub_item_seats(activity.id, pending[reserved:])
+    pending = pending[:reserved]
+
+    # 批量写入报名记录，只有新建或重新启用的记录会被RETURNING返回
+    admitted = set()
+    if pending:
+        now = datetime.utcnow()
+        table = Registration.__table__
+        stmt = sqlite_insert(table).values(
+            activity_id=activity.id,
+            user_id=bindparam('user_id'),
+            status='registered',
+            sub_item=bindparam('sub_item'),
+            registered_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['activity_id', 'user_id'],
+            set_={'status': 'registered', 'sub_item': stmt.excluded.sub_item, 'registered_at': now},
+            where=table.c.status == 'cancelled'
+        ).returning(table.c.user_id)
+        admitted = {user_id for (user_id,) in db.session.execute(
+            stmt, [{'user_id': user_id, 'sub_item': sub_item} for _, user_id, sub_item in pending]
+        )}
+        # 并发报名导致未写入的记录释放占用的名额
+        if len(admitted) < len(pending):
+            Activity.release_seat(activity.id, len(pending) - len(admitted))
+            _release_sub_item_seats(activity.id, [row for row in pending if row[1] not in admitted])
+
+    for row_number, user_id, _ in pending:
+        if user_id in admitted:
+            results[row_number] = (REGISTERED, '报名成功')
+        else:
+            results[row_number] = (SKIPPED, Registration.ERROR_DUPLICATE)
+
+    # 移除已报名学生的候补记录
+    for chunk in _chunks(admitted):
+        WaitlistEntry.query.filter(
+            WaitlistEntry.activity_id == activity.id, WaitlistEntry.user_id.in_(chunk)
+        ).delete(synchronize_session=False)
+
+    account_by_row = {row_number: account for row_number, account, _ in rows}
+    report = [
+        {'row': row_number, 'account': account_by_row[row_number], 'status': status, 'message': message}
+        for row_number, (status, message) in sorted(results.items())
+    ]
+    return {
+        'total': len(rows),
+        'registered': sum(1 for item in report if item['status'] == REGISTERED),
+        'skipped': sum(1 for item in report if item['status'] == SKIPPED),
+        'failed': sum(1 for item in report if item['status'] == FAILED),
+        'rows': report
+    }
@@ -0,0 +1,38 @@
+"""
+后台定时任务
+"""
+import threading
+import time
+import traceback
+from models import db
+
+
+def start_periodic_job(app, name, interval, func):
+    """
+    在后台守护线程中按固定间隔执行任务
+    
+    Args:
+        app: Flask应用，任务在其应用上下文中执行
+        name: 任务名称（用于线程名和日志）
+        interval: 执行间隔（秒）
+        func: 无参数的任务函数
+        
+    Returns:
+        threading.Thread: 已启动的线程
+    """
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    func()
+                except Exception:
+                    db.session.rollback()
+                    print(f"[ERROR] 定时任务 {name} 执行失败")
+                    traceback.print_exc()
+                finally:
+                    db.session.remove()
+            time.sleep(interval)
+    
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
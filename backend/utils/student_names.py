@@ -0,0 +1,85 @@
+"""
+学生姓名解析
+
+学生的真实姓名保存在Credential表中（以学号关联）。这里按批量方式解析，
+并在进程内用LRU缓存结果；登录时外部认证接口更新凭据后需调用
+invalidate_student_name 使对应缓存失效
+"""
+import threading
+from collections import OrderedDict
+from models import Credential
+
+# 缓存的最大学号数
+CACHE_SIZE = 10000
+
+# 学号 -> (是否存在凭据, 姓名)
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def resolve_student_names(account_ids):
+    """
+    批量解析学生姓名，未命中缓存的学号用一次查询加载
+
+    Args:
+        account_ids: 学号列表
+
+    Returns:
+        dict: {学号: (是否存在凭据, 姓名)}
+    """
+    result = {}
+    missing = []
+    with _lock:
+        for account_id in set(account_ids):
+            if account_id in _cache:
+                _cache.move_to_end(account_id)
+                result[account_id] = _cache[account_id]
+            else:
+                missing.append(account_id)
+
+    if missing:
+        names = dict(Credential.query.with_entities(
+            Credential.account_id, Credential.name
+        ).filter(Credential.account_id.in_(missing)).all())
+
+        with _lock:
+            for account_id in missing:
+                entry = (account_id in names, names.get(account_id))
+                _cache[account_id] = entry
+                result[account_id] = entry
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+
+    return result
+
+
+def resolve_user_identities(users):
+    """
+    批量获取用户的显示名称和账号
+
+    对于学生用户，使用Credential表中的真实姓名，并显示学号而不是邮箱
+
+    Args:
+        users: User对象列表，或包含id、username、email、role字段的行
+
+    Returns:
+        dict: {用户ID: (显示名称, 显示账号)}
+    """
+    students = resolve_student_names([user.username for user in users if user.role == 'student'])
+
+    result = {}
+    for user in users:
+        user_name = user.username
+        user_email = user.email
+        has_credential, name = students.get(user.username, (False, None)) if user.role == 'student' else (False, None)
+        if has_credential:
+            user_name = name if name else user.username
+            user_email = user.username  # 显示学号而不是邮箱
+        result[user.id] = (user_name, user_email)
+    return result
+
+
+def invalidate_student_name(account_id):
+    """使指定学号的缓存失效（凭据创建或姓名更新后调用）"""
+    with _lock:
+        _cache.pop(account_id, None)
@@ -14,7 +14,7 @@ export const checkinApi = {
 
   // Generate check-in QR code (organizer only)
   generateQRCode(activityId: number) {
-    return request.post<ApiResponse<{ qrData: string }>>(`/checkin/generate-qr/${activityId}`)
+    return request.post<ApiResponse<{ qrData: string; expiresAt: string; rotationSeconds: number }>>(`/checkin/generate-qr/${activityId}`)
   },
 
   // Generate check-in code (organizer only)
@@ -22,6 +22,17 @@ export const checkinApi = {
     return request.post<ApiResponse<CheckInCode>>(`/checkin/generate-code/${activityId}`, { duration })
   },
 
+  // Upload check-ins scanned offline (organizer only)
+  bulkSyncCheckIns(activityId: number, records: { userId: number; scannedAt: string; method: 'qrcode' | 'code' }[]) {
+    return request.post<ApiResponse<{
+      total: number
+      checkedIn: number
+      skipped: number
+      failed: number
+      results: ('checked_in' | 'already_checked_in' | 'duplicate' | 'not_registered' | 'invalid')[]
+    }>>(`/checkin/bulk/${activityId}`, { records })
+  },
+
   // Get check-in list for activity (organizer only)
   getActivityCheckIns(activityId: number) {
     return request.get<ApiResponse<CheckIn[]>>(`/checkin/activity/${activityId}`)
@@ -17,6 +17,14 @@ export const registrationApi = {
     return request.get<ApiResponse<PaginatedResponse<Registration>>>('/registrations/my', { params })
   },
 
+  // Get user's registrations page by page with a cursor (pass '' for the first page)
+  getMyRegistrationsByCursor(params: { cursor: string; pageSize?: number; view?: 'summary' }) {
+    return request.get<ApiResponse<{ items: Registration[]; nextCursor: string | null; pageSize: number }>>(
+      '/registrations/my',
+      { params }
+    )
+  },
+
   // Get registrations for an activity (organizer only)
   getActivityRegistrations(activityId: number, params?: { page?: number; pageSize?: number }) {
     return request.get<ApiResponse<PaginatedResponse<Registration>>>(`/registrations/activity/${activityId}`, { params })
@@ -25,5 +33,13 @@ export const registrationApi = {
   // Check registration status
   checkRegistrationStatus(activityId: number) {
     return request.get<ApiResponse<{ isRegistered: boolean; registration?: Registration }>>(`/registrations/status/${activityId}`)
+  },
+
+  // Check registration status for several activities in one request
+  checkRegistrationStatuses(activityIds: number[]) {
+    return request.get<ApiResponse<Record<string, { status: Registration['status']; subItem?: string } | null>>>(
+      '/registrations/status',
+      { params: { ids: activityIds.join(',') } }
+    )
   }
 }